@@ -3,89 +3,193 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, render_template, session, redirect, url_for
+from flask import Flask, render_template, redirect, url_for, g, request, current_app, has_request_context
 from flask_cors import CORS
-from src.models.unified_models import db, User, Category, Product, CartItem
-from src.routes.auth import auth_bp
-from src.routes.customer import customer_bp
-from src.routes.admin import admin_bp
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event, insert, text
+from src.models.unified_models import db, User, Category, Product
 from src.utils.auth import get_current_user
+from src.utils.cart import get_cart_count
+from src.utils.catalog import get_category_choices
 # from src.utils.scheduler import report_scheduler
+import logging
 import secrets
+import time
+from collections import Counter
+from pathlib import Path
 
-# Create Flask app
-app = Flask(__name__, 
-           template_folder=os.path.join(os.path.dirname(__file__), 'templates'),
-           static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+BASE_DIR = Path(__file__).resolve().parent
+DATABASE_PATH = BASE_DIR / 'database' / 'app.db'
+UPLOAD_FOLDER = BASE_DIR / 'static' / 'uploads'
+DEBUG = os.environ.get('FLASK_ENV') == 'development'
+QUERY_COUNT_WARNING = 10  # Queries per request before logging a likely N+1
+REPEATED_QUERY_WARNING = 3  # Runs of one statement per request before logging it as an N+1
+QUERY_LOG_ENABLED = DEBUG or os.environ.get('DB_QUERY_LOG_ENABLED') == '1'
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 8))  # gunicorn --threads, see Procfile
+SECRET_KEY_WAIT_TRIES = 100  # 50ms apart, while another worker writes the key file
+NOTIFICATION_RETRY_INTERVAL = 60  # Seconds between failed notification retry runs
 
-# Configuration
-app.config['SECRET_KEY'] = secrets.token_hex(32)
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Configure logging once for the whole app; modules only get their own loggers
+logging.basicConfig(level=logging.INFO)
 
-# Enable CORS for cross-origin requests
-CORS(app)
-
-# Initialize database
-db.init_app(app)
-
-# Initialize scheduler
-# report_scheduler.init_app(app)
+def load_secret_key(path):
+    """
+    Read the session secret key, creating it once on first boot
+    
+    Workers booting together race to create the file; O_EXCL lets exactly
+    one of them write the key and the others wait until it can be read.
+    """
+    for _ in range(SECRET_KEY_WAIT_TRIES):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            with open(path) as f:
+                secret_key = f.read().strip()
+            if secret_key:
+                return secret_key
+            time.sleep(0.05)  # Another worker created it and is still writing
+            continue
+        
+        secret_key = secrets.token_hex(32)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secret_key)
+        return secret_key
+    
+    raise RuntimeError(f'Secret key file {path} is empty; delete it to generate a new key')
 
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(customer_bp, url_prefix='/')
-app.register_blueprint(admin_bp, url_prefix='/admin')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Use WAL so page reads are not blocked by checkout writes"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA cache_size=-64000')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.close()
 
-# Import and register tax blueprint
-from src.routes.tax_api import tax_bp
-app.register_blueprint(tax_bp, url_prefix='/tax')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """Count SQL statements issued during the current request"""
+    if has_request_context() and not g.get('skip_query_count'):
+        g.query_count = g.get('query_count', 0) + 1
+        if 'query_statements' not in g:
+            g.query_statements = Counter()
+        g.query_statements[statement] += 1
 
-# Create upload directory if it doesn't exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+def log_query_count(response):
+    """Warn about requests over their view's query budget or repeating a statement"""
+    query_count = g.get('query_count', 0)
+    view = current_app.view_functions.get(request.endpoint)
+    if query_count > getattr(view, 'query_budget', QUERY_COUNT_WARNING):
+        current_app.logger.warning('Possible N+1: %d queries on %s', query_count, request.path)
+    for statement, runs in g.get('query_statements', Counter()).items():
+        if runs > REPEATED_QUERY_WARNING:
+            current_app.logger.warning('Possible N+1: %d runs on %s of %s', runs, request.path, statement)
+    return response
 
 # Template context processors
-@app.context_processor
-def inject_user():
-    """Inject current user into all templates"""
-    return dict(current_user=get_current_user())
-
-@app.context_processor
-def inject_cart_count():
-    """Inject cart item count into all templates"""
-    cart_count = 0
-    if 'user_id' in session:
-        cart_count = CartItem.query.filter_by(user_id=session['user_id']).count()
-    return dict(cart_count=cart_count)
-
-@app.context_processor
-def inject_categories():
-    """Inject active categories into all templates"""
-    categories = Category.query.filter_by(is_active=True).all()
-    return dict(categories=categories)
+def inject_template_globals():
+    """Inject current user, cart item count and active categories into all templates"""
+    current_user = get_current_user()
+    # The cart count and nav categories are cached and only refilled now and
+    # then, so those refills are left out of the view's query budget
+    g.skip_query_count = True
+    try:
+        cart_count = get_cart_count()
+        categories = get_category_choices()
+    finally:
+        g.skip_query_count = False
+    return dict(
+        current_user=current_user,
+        cart_count=cart_count,
+        categories=categories
+    )
 
 # Main routes
-@app.route('/')
 def home():
     """Home page - redirect to customer home"""
     return redirect(url_for('customer.home'))
 
 # Error handlers
-@app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('errors/500.html'), 500
 
-@app.errorhandler(403)
 def forbidden_error(error):
     return render_template('errors/403.html'), 403
 
+def create_app():
+    """Create and configure the Flask app"""
+    app = Flask(__name__, 
+               template_folder=str(BASE_DIR / 'templates'),
+               static_folder=str(BASE_DIR / 'static'))
+    
+    # Configuration
+    # Shared by every worker so sessions survive across processes and restarts
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or load_secret_key(
+        BASE_DIR / '.secret_key')
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{DATABASE_PATH}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # One pooled connection per request thread plus headroom; each request
+    # gets its own scoped session
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        'pool_size': WORKER_THREADS + 2,
+        'max_overflow': 10,
+    }
+    # Work factor for new password hashes; existing hashes keep verifying with
+    # the method stored in them, so this can be lowered for local test runs
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 12 * 60 * 60  # Let browsers cache static files and uploads for 12h
+    app.config['TEMPLATES_AUTO_RELOAD'] = DEBUG
+    app.config['EXPLAIN_TEMPLATE_LOADING'] = False
+    
+    # JSON responses are built from dicts in a fixed order already; skip re-sorting their keys
+    app.json.sort_keys = False
+    
+    # Share compiled templates across workers; TEMPLATES_AUTO_RELOAD skips
+    # per-render mtime checks outside development
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    
+    # Enable CORS for cross-origin requests
+    CORS(app)
+    
+    # Initialize database
+    db.init_app(app)
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_sqlite_pragmas)
+        # On in development; DB_QUERY_LOG_ENABLED=1 turns it on elsewhere
+        if QUERY_LOG_ENABLED:
+            event.listen(db.engine, 'before_cursor_execute', count_query)
+            app.after_request(log_query_count)
+    
+    # Initialize scheduler
+    # report_scheduler.init_app(app)
+    
+    # Register blueprints, imported here so their modules load only when an app is built
+    from src.routes.auth import auth_bp
+    from src.routes.customer import customer_bp
+    from src.routes.admin import admin_bp
+    from src.routes.tax_api import tax_bp
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(customer_bp, url_prefix='/')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(tax_bp, url_prefix='/tax')
+    
+    app.context_processor(inject_template_globals)
+    app.add_url_rule('/', 'home', home)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, internal_error)
+    app.register_error_handler(403, forbidden_error)
+    
+    return app
+
+app = create_app()
+
 # Initialize database and create sample data
 def init_database():
     """Initialize database with sample data"""
@@ -93,17 +197,45 @@ def init_database():
         # Create all tables
         db.create_all()
         
+        # The unique cart index allows one row per user and product; fold any
+        # duplicates saved before it existed into the oldest row
+        db.session.execute(text(
+            'UPDATE cart_items SET quantity = (SELECT SUM(c.quantity) FROM cart_items AS c '
+            'WHERE c.user_id = cart_items.user_id AND c.product_id = cart_items.product_id) '
+            'WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)'
+        ))
+        db.session.execute(text(
+            'DELETE FROM cart_items WHERE id NOT IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id)'
+        ))
+        db.session.commit()
+        
+        # create_all skips existing tables, so add any indexes they are missing
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        
+        # Admin access now follows users.role; carry over the old is_admin flag
+        if 'is_admin' in {column['name'] for column in db.inspect(db.engine).get_columns('users')}:
+            db.session.execute(text("UPDATE users SET role = 'admin' WHERE is_admin = 1 AND role != 'admin'"))
+            db.session.commit()
+        
         # Check if we already have data
-        if User.query.first() is not None:
+        if db.session.query(User.id).first() is not None:
             return
         
+        # Seed in one transaction without fsyncs; settings are restored after the commit
+        journal_mode = db.session.execute(text('PRAGMA journal_mode')).scalar()
+        synchronous = db.session.execute(text('PRAGMA synchronous')).scalar()
+        db.session.execute(text('PRAGMA synchronous=OFF'))
+        db.session.execute(text('PRAGMA journal_mode=MEMORY'))
+        
         # Create admin user
         admin_user = User(
             username='admin',
             email='admin@moktrading.com',
             first_name='Admin',
             last_name='User',
-            is_admin=True
+            role='admin'
         )
         admin_user.set_password('admin123')
         db.session.add(admin_user)
@@ -132,13 +264,10 @@ def init_database():
             {'name': 'Accessories', 'description': 'Smoking accessories and tools'}
         ]
         
-        categories = []
-        for cat_data in categories_data:
-            category = Category(**cat_data)
-            categories.append(category)
-            db.session.add(category)
-        
-        db.session.commit()
+        categories = [Category(**cat_data) for cat_data in categories_data]
+        db.session.add_all(categories)
+        db.session.flush()  # Get category IDs
+        category_ids = {category.name: category.id for category in categories}
         
         # Create sample products
         products_data = [
@@ -147,7 +276,7 @@ def init_database():
                 'description': 'Premium light cigarettes with smooth taste and refined flavor profile',
                 'price': 12.99,
                 'stock_quantity': 100,
-                'category_id': categories[0].id,
+                'category_id': category_ids['Cigarettes'],
                 'brand': 'Marlboro',
                 'is_featured': True
             },
@@ -156,7 +285,7 @@ def init_database():
                 'description': 'Rich Turkish blend cigarettes with distinctive aroma and full-bodied taste',
                 'price': 13.49,
                 'stock_quantity': 85,
-                'category_id': categories[0].id,
+                'category_id': category_ids['Cigarettes'],
                 'brand': 'Camel',
                 'is_featured': True
             },
@@ -165,7 +294,7 @@ def init_database():
                 'description': 'Classic Cuban-style cigars with complex flavor notes and smooth finish',
                 'price': 45.99,
                 'stock_quantity': 25,
-                'category_id': categories[1].id,
+                'category_id': category_ids['Cigars'],
                 'brand': 'Romeo y Julieta',
                 'is_featured': True
             },
@@ -174,7 +303,7 @@ def init_database():
                 'description': 'Premium torpedo cigars with rich, full-bodied flavor and excellent construction',
                 'price': 52.99,
                 'stock_quantity': 30,
-                'category_id': categories[1].id,
+                'category_id': category_ids['Cigars'],
                 'brand': 'Montecristo'
             },
             {
@@ -182,7 +311,7 @@ def init_database():
                 'description': 'Mild and aromatic pipe tobacco with sweet vanilla notes',
                 'price': 8.99,
                 'stock_quantity': 50,
-                'category_id': categories[2].id,
+                'category_id': category_ids['Pipe Tobacco'],
                 'brand': 'Captain Black'
             },
             {
@@ -190,7 +319,7 @@ def init_database():
                 'description': 'English breakfast blend pipe tobacco with Oriental and Virginia tobaccos',
                 'price': 15.99,
                 'stock_quantity': 40,
-                'category_id': categories[2].id,
+                'category_id': category_ids['Pipe Tobacco'],
                 'brand': 'Dunhill'
             },
             {
@@ -198,7 +327,7 @@ def init_database():
                 'description': 'Natural unrefined rolling papers made from pure hemp',
                 'price': 2.99,
                 'stock_quantity': 200,
-                'category_id': categories[3].id,
+                'category_id': category_ids['Rolling Papers'],
                 'brand': 'RAW',
                 'is_featured': True
             },
@@ -207,7 +336,7 @@ def init_database():
                 'description': 'Windproof lighter with lifetime guarantee and iconic design',
                 'price': 24.99,
                 'stock_quantity': 75,
-                'category_id': categories[4].id,
+                'category_id': category_ids['Accessories'],
                 'brand': 'Zippo'
             },
             {
@@ -215,7 +344,7 @@ def init_database():
                 'description': 'Cool menthol cigarettes with refreshing taste',
                 'price': 11.99,
                 'stock_quantity': 90,
-                'category_id': categories[0].id,
+                'category_id': category_ids['Cigarettes'],
                 'brand': 'Newport'
             },
             {
@@ -223,24 +352,41 @@ def init_database():
                 'description': 'Premium Cuban cigars with exceptional quality and flavor',
                 'price': 65.99,
                 'stock_quantity': 15,
-                'category_id': categories[1].id,
+                'category_id': category_ids['Cigars'],
                 'brand': 'Cohiba',
                 'is_featured': True
             }
         ]
         
-        for product_data in products_data:
-            product = Product(**product_data)
-            db.session.add(product)
-        
+        db.session.execute(insert(Product), products_data)  # Single executemany
         db.session.commit()
+        db.session.execute(text(f'PRAGMA journal_mode={journal_mode}'))
+        db.session.execute(text(f'PRAGMA synchronous={synchronous}'))
         print("Database initialized with sample data!")
 
+def run_notification_worker():
+    """
+    Resend stored failed notifications every NOTIFICATION_RETRY_INTERVAL seconds
+    
+    Runs as its own single process (Procfile clock), not in the web workers.
+    """
+    from src.utils.notifications import notification_service
+    logger = logging.getLogger(__name__)
+    while True:
+        with app.app_context():
+            try:
+                sent = notification_service.retry_failed_notifications()
+                if sent:
+                    logger.info("Resent %d failed notifications", sent)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Error retrying failed notifications")
+        time.sleep(NOTIFICATION_RETRY_INTERVAL)
+
 if __name__ == '__main__':
     init_database()
     
     # Start the automated report scheduler
     # report_scheduler.start_scheduler()
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
-
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG)
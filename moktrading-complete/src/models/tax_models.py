@@ -1,530 +1,739 @@
 """
 Tax Models for State Tobacco Tax Calculations
 Handles cigarette, cigar, vape, and sales tax calculations by state
+
+All amounts stay Decimal end to end. Sales tax on excise-inclusive prices
+produces more than four fractional digits (e.g. 12.99 * 0.0725), so scaled
+integer or float arithmetic would round before callers do; speed comes from
+the precomputed per-state tables and memoization instead.
 """
 
-from decimal import Decimal, ROUND_HALF_UP
-from typing import Dict, Optional, Tuple
-import json
+from decimal import Decimal
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+TOTAL_TAX_CACHE_SIZE = 4096
+
+_D0 = Decimal('0')
+_D1 = Decimal('1')
+_VT_CIGAR_PRICE_THRESHOLD = Decimal('10')  # Vermont cigar cap switches at this wholesale price
+
+class TaxBreakdown(NamedTuple):
+    """Excise, sales and total tax for one line item"""
+    excise: Decimal
+    sales: Decimal
+    total: Decimal
+    
+    def to_dict(self) -> Dict[str, Decimal]:
+        """Breakdown in the dict shape returned by calculate_total_tax"""
+        return {
+            'excise_tax': self.excise,
+            'sales_tax': self.sales,
+            'total_tax': self.total
+        }
+
+_NO_TAX = TaxBreakdown(_D0, _D0, _D0)
+_NO_LICENSE_STATES = frozenset(['DE', 'MT', 'NH', 'OR'])  # Simplified list
+
+# Only two possible filing requirement answers, so build them once
+_FILING_REGISTRATION_REQUIRED = {
+    'frequency': 'Monthly',  # Most common
+    'due_date': '20th of following month',  # Most common
+    'registration_required': 'Yes',
+    'bond_required': 'Varies by state',
+    'notes': 'Consult state tobacco tax authority for specific requirements'
+}
+_FILING_NO_REGISTRATION = dict(_FILING_REGISTRATION_REQUIRED, registration_required='No')
+
+# State tax table, built once at import and shared by every calculator instance
+TAX_DATA = {
+    'AL': {  # Alabama
+        'cigarette_tax': Decimal('0.675'),
+        'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.0405')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.04')
+    },
+    'AK': {  # Alaska
+        'cigarette_tax': Decimal('2.000'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.75')},
+        'vape_tax': None,
+        'sales_tax_applies': False,
+        'sales_tax_rate': Decimal('0.00')
+    },
+    'AZ': {  # Arizona
+        'cigarette_tax': Decimal('2.000'),
+        'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.218')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.056')
+    },
+    'AR': {  # Arkansas
+        'cigarette_tax': Decimal('1.150'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.68'), 'cap': Decimal('0.50')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.065')
+    },
+    'CA': {  # California
+        'cigarette_tax': Decimal('2.870'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.5427')},
+        'vape_tax': {'type': 'dual', 'wholesale': Decimal('0.5632'), 'retail': Decimal('0.125')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0725')
+    },
+    'CO': {  # Colorado
+        'cigarette_tax': Decimal('1.940'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.56')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.50')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.029')
+    },
+    'CT': {  # Connecticut
+        'cigarette_tax': Decimal('4.350'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50'), 'cap': Decimal('0.50')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.10'), 'closed': Decimal('0.40')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0635')
+    },
+    'DE': {  # Delaware - Your home state
+        'cigarette_tax': Decimal('2.100'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
+        'sales_tax_applies': False,
+        'sales_tax_rate': Decimal('0.00')
+    },
+    'DC': {  # District of Columbia
+        'cigarette_tax': Decimal('4.500'),
+        'cigar_tax': {'type': 'none'},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.79')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'FL': {  # Florida
+        'cigarette_tax': Decimal('1.339'),
+        'cigar_tax': {'type': 'none'},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'GA': {  # Georgia
+        'cigarette_tax': Decimal('0.370'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.23')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.07'), 'closed': Decimal('0.05')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.04')
+    },
+    'HI': {  # Hawaii
+        'cigarette_tax': Decimal('3.200'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.70')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.04')
+    },
+    'ID': {  # Idaho
+        'cigarette_tax': Decimal('0.570'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.40'), 'cap': Decimal('0.50')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'IL': {  # Illinois
+        'cigarette_tax': Decimal('2.980'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.45')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0625')
+    },
+    'IN': {  # Indiana
+        'cigarette_tax': Decimal('0.995'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30'), 'cap': Decimal('3.00')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.15'), 'closed': Decimal('0.15')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.07')
+    },
+    'IA': {  # Iowa
+        'cigarette_tax': Decimal('1.360'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50'), 'cap': Decimal('0.50')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'KS': {  # Kansas
+        'cigarette_tax': Decimal('1.290'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.10')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.065')
+    },
+    'KY': {  # Kentucky
+        'cigarette_tax': Decimal('1.100'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.15'), 'closed': Decimal('1.50')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'LA': {  # Louisiana
+        'cigarette_tax': Decimal('1.080'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.15')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0445')
+    },
+    'ME': {  # Maine
+        'cigarette_tax': Decimal('2.000'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.43')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.43')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.055')
+    },
+    'MD': {  # Maryland
+        'cigarette_tax': Decimal('3.750'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.12'), 'closed': Decimal('0.60')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'MA': {  # Massachusetts
+        'cigarette_tax': Decimal('3.510'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.40')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.75')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0625')
+    },
+    'MI': {  # Michigan
+        'cigarette_tax': Decimal('2.000'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.32'), 'cap': Decimal('0.50')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'MN': {  # Minnesota
+        'cigarette_tax': Decimal('3.040'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.95'), 'cap': Decimal('0.50')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.95')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06875')
+    },
+    'MS': {  # Mississippi
+        'cigarette_tax': Decimal('0.680'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.07')
+    },
+    'MO': {  # Missouri
+        'cigarette_tax': Decimal('0.170'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.10')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.04225')
+    },
+    'MT': {  # Montana
+        'cigarette_tax': Decimal('1.700'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50'), 'cap': Decimal('0.35')},
+        'vape_tax': None,
+        'sales_tax_applies': False,
+        'sales_tax_rate': Decimal('0.00')
+    },
+    'NE': {  # Nebraska
+        'cigarette_tax': Decimal('0.640'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
+        'vape_tax': {'type': 'bifurcated', 'small': Decimal('0.05'), 'large': Decimal('0.10')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.055')
+    },
+    'NV': {  # Nevada
+        'cigarette_tax': Decimal('1.800'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0685')
+    },
+    'NH': {  # New Hampshire
+        'cigarette_tax': Decimal('1.780'),
+        'cigar_tax': {'type': 'none'},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.08'), 'closed': Decimal('0.30')},
+        'sales_tax_applies': False,
+        'sales_tax_rate': Decimal('0.00')
+    },
+    'NJ': {  # New Jersey
+        'cigarette_tax': Decimal('2.700'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.10'), 'closed': Decimal('0.10')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06625')
+    },
+    'NM': {  # New Mexico
+        'cigarette_tax': Decimal('2.000'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.25'), 'cap': Decimal('0.50')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.125'), 'closed': Decimal('0.50')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.05125')
+    },
+    'NY': {  # New York
+        'cigarette_tax': Decimal('5.350'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.75')},
+        'vape_tax': {'type': 'retail', 'rate': Decimal('0.20')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.08')
+    },
+    'NC': {  # North Carolina
+        'cigarette_tax': Decimal('0.450'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.1285')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0475')
+    },
+    'ND': {  # North Dakota
+        'cigarette_tax': Decimal('0.440'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.28')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.05')
+    },
+    'OH': {  # Ohio
+        'cigarette_tax': Decimal('1.600'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.17'), 'cap': Decimal('0.65')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.10')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0575')
+    },
+    'OK': {  # Oklahoma
+        'cigarette_tax': Decimal('2.030'),
+        'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.12')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.045')
+    },
+    'OR': {  # Oregon
+        'cigarette_tax': Decimal('3.330'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.65'), 'cap': Decimal('1.00')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.65')},
+        'sales_tax_applies': False,
+        'sales_tax_rate': Decimal('0.00')
+    },
+    'PA': {  # Pennsylvania
+        'cigarette_tax': Decimal('2.600'),
+        'cigar_tax': {'type': 'none'},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.40')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'RI': {  # Rhode Island
+        'cigarette_tax': Decimal('4.250'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.80'), 'cap': Decimal('0.50')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.07')
+    },
+    'SC': {  # South Carolina
+        'cigarette_tax': Decimal('0.570'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.055')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'SD': {  # South Dakota
+        'cigarette_tax': Decimal('1.530'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.35')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.045')
+    },
+    'TN': {  # Tennessee
+        'cigarette_tax': Decimal('0.620'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.066')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.07')
+    },
+    'TX': {  # Texas
+        'cigarette_tax': Decimal('1.410'),
+        'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.011')},
+        'vape_tax': None,
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0625')
+    },
+    'UT': {  # Utah
+        'cigarette_tax': Decimal('1.700'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.86')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.56')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.0485')
+    },
+    'VT': {  # Vermont
+        'cigarette_tax': Decimal('3.080'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.92'), 'cap_low': Decimal('2.00'), 'cap_high': Decimal('4.00')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.92')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'VA': {  # Virginia
+        'cigarette_tax': Decimal('0.600'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.066')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.053')
+    },
+    'WA': {  # Washington
+        'cigarette_tax': Decimal('3.025'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.95'), 'cap': Decimal('0.65')},
+        'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.09'), 'closed': Decimal('0.27')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.065')
+    },
+    'WV': {  # West Virginia
+        'cigarette_tax': Decimal('1.200'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.12')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.075')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.06')
+    },
+    'WI': {  # Wisconsin
+        'cigarette_tax': Decimal('2.520'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.71'), 'cap': Decimal('0.50')},
+        'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.05')
+    },
+    'WY': {  # Wyoming
+        'cigarette_tax': Decimal('0.600'),
+        'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
+        'vape_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
+        'sales_tax_applies': True,
+        'sales_tax_rate': Decimal('0.04')
+    }
+}
+
+class CigarTax(NamedTuple):
+    """Flattened cigar tax rule; unused slots are None"""
+    tag: int
+    rate: Optional[Decimal]
+    cap: Optional[Decimal]
+    cap_low: Optional[Decimal]
+    cap_high: Optional[Decimal]
+
+_CIGAR_NONE, _CIGAR_PERCENTAGE, _CIGAR_PER_UNIT = range(3)
+_CIGAR_TAGS_BY_TYPE = {'percentage': _CIGAR_PERCENTAGE, 'per_unit': _CIGAR_PER_UNIT}
+
+def _pack_cigar_tax(cigar_tax_info: Dict) -> CigarTax:
+    """Flatten a cigar_tax dict into a CigarTax tuple"""
+    cap_low = cigar_tax_info.get('cap_low')
+    cap_high = cigar_tax_info.get('cap_high')
+    if cap_low is None or cap_high is None:
+        cap_low = cap_high = None
+    return CigarTax(
+        tag=_CIGAR_TAGS_BY_TYPE.get(cigar_tax_info['type'], _CIGAR_NONE),
+        rate=cigar_tax_info.get('rate'),
+        cap=cigar_tax_info.get('cap'),
+        cap_low=cap_low,
+        cap_high=cap_high
+    )
+
+class VapeTax(NamedTuple):
+    """
+    Flattened vape tax rule
+    a/b hold (rate, None), (open, closed) or (wholesale, retail) depending on tag
+    """
+    tag: int
+    a: Optional[Decimal]
+    b: Optional[Decimal]
+
+_VAPE_NONE, _VAPE_PERCENTAGE, _VAPE_PER_ML, _VAPE_BIFURCATED, _VAPE_DUAL = range(5)
+_VAPE_NO_TAX = VapeTax(_VAPE_NONE, None, None)
+
+def _pack_vape_tax(vape_tax_info: Optional[Dict]) -> VapeTax:
+    """Flatten a vape_tax dict into a VapeTax tuple"""
+    if not vape_tax_info:
+        return _VAPE_NO_TAX
+    
+    tax_type = vape_tax_info['type']
+    if tax_type == 'percentage':
+        return VapeTax(_VAPE_PERCENTAGE, vape_tax_info['rate'], None)
+    elif tax_type == 'per_ml':
+        return VapeTax(_VAPE_PER_ML, vape_tax_info['rate'], None)
+    elif tax_type == 'bifurcated':
+        return VapeTax(_VAPE_BIFURCATED, vape_tax_info.get('open'), vape_tax_info.get('closed'))
+    elif tax_type == 'dual':
+        return VapeTax(_VAPE_DUAL, vape_tax_info.get('wholesale'), vape_tax_info.get('retail'))
+    return _VAPE_NO_TAX
+
+# Vape tax handlers, dispatched by tag instead of comparing type strings per call
+def _vape_no_tax(vape_tax, product_type, price, volume_ml, quantity):
+    return _D0
+
+def _vape_percentage_tax(vape_tax, product_type, price, volume_ml, quantity):
+    if price:
+        return price * vape_tax.a * Decimal(quantity)
+    return _D0
+
+def _vape_per_ml_tax(vape_tax, product_type, price, volume_ml, quantity):
+    if volume_ml:
+        return volume_ml * vape_tax.a * Decimal(quantity)
+    return _D0
+
+def _vape_bifurcated_tax(vape_tax, product_type, price, volume_ml, quantity):
+    if product_type == 'open' and vape_tax.a is not None:
+        # Percentage rate
+        if price:
+            return price * vape_tax.a * Decimal(quantity)
+        elif volume_ml:
+            return volume_ml * vape_tax.a * Decimal(quantity)
+    elif product_type == 'closed' and vape_tax.b is not None:
+        if vape_tax.b < _D1:  # Percentage
+            if price:
+                return price * vape_tax.b * Decimal(quantity)
+        else:  # Per unit or per mL
+            if volume_ml:
+                return volume_ml * vape_tax.b * Decimal(quantity)
+            else:
+                return vape_tax.b * Decimal(quantity)
+    return _D0
+
+def _vape_dual_tax(vape_tax, product_type, price, volume_ml, quantity):
+    # California special case - both wholesale and retail tax
+    total_tax = _D0
+    if price and vape_tax.a is not None:
+        total_tax += price * vape_tax.a
+    if price and vape_tax.b is not None:
+        total_tax += price * vape_tax.b
+    return total_tax * Decimal(quantity)
+
+# Vape product types and the system they are taxed as; generic vapes are taxed as closed systems
+_VAPE_TYPE_MAP = {
+    'vape': 'closed',
+    'e-cigarette': 'closed',
+    'vape_open': 'open',
+    'vape_closed': 'closed'
+}
+
+# Indexed by VapeTax.tag
+_VAPE_HANDLERS = (_vape_no_tax, _vape_percentage_tax, _vape_per_ml_tax, _vape_bifurcated_tax, _vape_dual_tax)
+
+def _build_cigar_excise(cigar_tax: CigarTax) -> Callable:
+    """Specialize a state's cigar rule into a straight-line (price, quantity) function"""
+    rate, cap = cigar_tax.rate, cigar_tax.cap
+    
+    if cigar_tax.tag == _CIGAR_PER_UNIT:
+        return lambda wholesale_price, quantity: rate * Decimal(quantity)
+    
+    if cigar_tax.tag != _CIGAR_PERCENTAGE:
+        return lambda wholesale_price, quantity: _D0
+    
+    if cap is not None:
+        return lambda wholesale_price, quantity: min(wholesale_price * rate, cap) * Decimal(quantity)
+    
+    if cigar_tax.cap_low is not None:
+        # Vermont special case
+        cap_low, cap_high = cigar_tax.cap_low, cigar_tax.cap_high
+        def vermont_cigar_tax(wholesale_price, quantity):
+            cap = cap_low if wholesale_price < _VT_CIGAR_PRICE_THRESHOLD else cap_high
+            return min(wholesale_price * rate, cap) * Decimal(quantity)
+        return vermont_cigar_tax
+    
+    return lambda wholesale_price, quantity: wholesale_price * rate * Decimal(quantity)
+
+def _build_excise(cigarette_rate: Decimal, cigar_tax: CigarTax, vape_tax: VapeTax) -> Dict[str, Callable]:
+    """
+    Specialize a state's excise rules per product type
+    Each function takes (base_price, quantity, volume_ml), so calculate_total_tax
+    does no branching on tax types or caps at runtime
+    """
+    cigar_excise = _build_cigar_excise(cigar_tax)
+    vape_handler = _VAPE_HANDLERS[vape_tax.tag]
+    
+    def cigarette_excise(base_price, quantity, volume_ml):
+        return cigarette_rate * Decimal(quantity)
+    
+    def cigars_excise(base_price, quantity, volume_ml):
+        return cigar_excise(base_price, quantity)
+    
+    def open_vape_excise(base_price, quantity, volume_ml):
+        return vape_handler(vape_tax, 'open', base_price, volume_ml, quantity)
+    
+    def closed_vape_excise(base_price, quantity, volume_ml):
+        return vape_handler(vape_tax, 'closed', base_price, volume_ml, quantity)
+    
+    vape_excise = {'open': open_vape_excise, 'closed': closed_vape_excise}
+    excise = {
+        'cigarettes': cigarette_excise,
+        'cigars': cigars_excise,
+        'cigar': cigars_excise
+    }
+    for product_type, vape_type in _VAPE_TYPE_MAP.items():
+        excise[product_type] = vape_excise[vape_type]
+    return excise
+
+class StateTax(NamedTuple):
+    """Flattened tax rules for one state; rates stay Decimal so results are exact to the cent"""
+    cigarette_rate: Decimal
+    cigar: CigarTax
+    vape: VapeTax
+    sales_rate: Optional[Decimal]  # None when sales tax does not apply
+    excise: Dict[str, Callable]  # product_type -> specialized excise function
+
+def _pack_state_tax(info: Dict) -> StateTax:
+    """Flatten a state's TAX_DATA entry into a StateTax tuple"""
+    cigar_tax = _pack_cigar_tax(info['cigar_tax'])
+    vape_tax = _pack_vape_tax(info['vape_tax'])
+    return StateTax(
+        cigarette_rate=info['cigarette_tax'],
+        cigar=cigar_tax,
+        vape=vape_tax,
+        sales_rate=info['sales_tax_rate'] if info['sales_tax_applies'] else None,
+        excise=_build_excise(info['cigarette_tax'], cigar_tax, vape_tax)
+    )
+
+def _sales_tax(state_tax: StateTax, taxable_amount: Decimal) -> Decimal:
+    """Apply a state's sales tax, if it has one"""
+    if state_tax.sales_rate is None:
+        return _D0
+    return taxable_amount * state_tax.sales_rate
+
+_STATE_TAXES = {state: _pack_state_tax(info) for state, info in TAX_DATA.items()}
 
 class StateTobaccoTax:
     """Comprehensive state tobacco tax calculator for all 50 states + DC"""
     
     def __init__(self):
         self.tax_data = self._load_tax_data()
+        self._state_taxes = _STATE_TAXES
+        
+        # Carts re-price the same products over and over, and the inputs are all hashable
+        self._total_tax_cache = lru_cache(maxsize=TOTAL_TAX_CACHE_SIZE)(self._calculate_total_tax)
     
     def _load_tax_data(self) -> Dict:
         """Load comprehensive tax data for all states"""
-        return {
-            'AL': {  # Alabama
-                'cigarette_tax': Decimal('0.675'),
-                'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.0405')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.04')
-            },
-            'AK': {  # Alaska
-                'cigarette_tax': Decimal('2.000'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.75')},
-                'vape_tax': None,
-                'sales_tax_applies': False,
-                'sales_tax_rate': Decimal('0.00')
-            },
-            'AZ': {  # Arizona
-                'cigarette_tax': Decimal('2.000'),
-                'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.218')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.056')
-            },
-            'AR': {  # Arkansas
-                'cigarette_tax': Decimal('1.150'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.68'), 'cap': Decimal('0.50')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.065')
-            },
-            'CA': {  # California
-                'cigarette_tax': Decimal('2.870'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.5427')},
-                'vape_tax': {'type': 'dual', 'wholesale': Decimal('0.5632'), 'retail': Decimal('0.125')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0725')
-            },
-            'CO': {  # Colorado
-                'cigarette_tax': Decimal('1.940'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.56')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.50')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.029')
-            },
-            'CT': {  # Connecticut
-                'cigarette_tax': Decimal('4.350'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50'), 'cap': Decimal('0.50')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.10'), 'closed': Decimal('0.40')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0635')
-            },
-            'DE': {  # Delaware - Your home state
-                'cigarette_tax': Decimal('2.100'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
-                'sales_tax_applies': False,
-                'sales_tax_rate': Decimal('0.00')
-            },
-            'DC': {  # District of Columbia
-                'cigarette_tax': Decimal('4.500'),
-                'cigar_tax': {'type': 'none'},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.79')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'FL': {  # Florida
-                'cigarette_tax': Decimal('1.339'),
-                'cigar_tax': {'type': 'none'},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'GA': {  # Georgia
-                'cigarette_tax': Decimal('0.370'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.23')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.07'), 'closed': Decimal('0.05')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.04')
-            },
-            'HI': {  # Hawaii
-                'cigarette_tax': Decimal('3.200'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.70')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.04')
-            },
-            'ID': {  # Idaho
-                'cigarette_tax': Decimal('0.570'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.40'), 'cap': Decimal('0.50')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'IL': {  # Illinois
-                'cigarette_tax': Decimal('2.980'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.45')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0625')
-            },
-            'IN': {  # Indiana
-                'cigarette_tax': Decimal('0.995'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30'), 'cap': Decimal('3.00')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.15'), 'closed': Decimal('0.15')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.07')
-            },
-            'IA': {  # Iowa
-                'cigarette_tax': Decimal('1.360'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50'), 'cap': Decimal('0.50')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'KS': {  # Kansas
-                'cigarette_tax': Decimal('1.290'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.10')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.065')
-            },
-            'KY': {  # Kentucky
-                'cigarette_tax': Decimal('1.100'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.15'), 'closed': Decimal('1.50')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'LA': {  # Louisiana
-                'cigarette_tax': Decimal('1.080'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.15')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0445')
-            },
-            'ME': {  # Maine
-                'cigarette_tax': Decimal('2.000'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.43')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.43')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.055')
-            },
-            'MD': {  # Maryland
-                'cigarette_tax': Decimal('3.750'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.12'), 'closed': Decimal('0.60')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'MA': {  # Massachusetts
-                'cigarette_tax': Decimal('3.510'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.40')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.75')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0625')
-            },
-            'MI': {  # Michigan
-                'cigarette_tax': Decimal('2.000'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.32'), 'cap': Decimal('0.50')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'MN': {  # Minnesota
-                'cigarette_tax': Decimal('3.040'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.95'), 'cap': Decimal('0.50')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.95')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06875')
-            },
-            'MS': {  # Mississippi
-                'cigarette_tax': Decimal('0.680'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.07')
-            },
-            'MO': {  # Missouri
-                'cigarette_tax': Decimal('0.170'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.10')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.04225')
-            },
-            'MT': {  # Montana
-                'cigarette_tax': Decimal('1.700'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.50'), 'cap': Decimal('0.35')},
-                'vape_tax': None,
-                'sales_tax_applies': False,
-                'sales_tax_rate': Decimal('0.00')
-            },
-            'NE': {  # Nebraska
-                'cigarette_tax': Decimal('0.640'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
-                'vape_tax': {'type': 'bifurcated', 'small': Decimal('0.05'), 'large': Decimal('0.10')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.055')
-            },
-            'NV': {  # Nevada
-                'cigarette_tax': Decimal('1.800'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0685')
-            },
-            'NH': {  # New Hampshire
-                'cigarette_tax': Decimal('1.780'),
-                'cigar_tax': {'type': 'none'},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.08'), 'closed': Decimal('0.30')},
-                'sales_tax_applies': False,
-                'sales_tax_rate': Decimal('0.00')
-            },
-            'NJ': {  # New Jersey
-                'cigarette_tax': Decimal('2.700'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.30')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.10'), 'closed': Decimal('0.10')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06625')
-            },
-            'NM': {  # New Mexico
-                'cigarette_tax': Decimal('2.000'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.25'), 'cap': Decimal('0.50')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.125'), 'closed': Decimal('0.50')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.05125')
-            },
-            'NY': {  # New York
-                'cigarette_tax': Decimal('5.350'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.75')},
-                'vape_tax': {'type': 'retail', 'rate': Decimal('0.20')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.08')
-            },
-            'NC': {  # North Carolina
-                'cigarette_tax': Decimal('0.450'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.1285')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0475')
-            },
-            'ND': {  # North Dakota
-                'cigarette_tax': Decimal('0.440'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.28')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.05')
-            },
-            'OH': {  # Ohio
-                'cigarette_tax': Decimal('1.600'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.17'), 'cap': Decimal('0.65')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.10')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0575')
-            },
-            'OK': {  # Oklahoma
-                'cigarette_tax': Decimal('2.030'),
-                'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.12')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.045')
-            },
-            'OR': {  # Oregon
-                'cigarette_tax': Decimal('3.330'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.65'), 'cap': Decimal('1.00')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.65')},
-                'sales_tax_applies': False,
-                'sales_tax_rate': Decimal('0.00')
-            },
-            'PA': {  # Pennsylvania
-                'cigarette_tax': Decimal('2.600'),
-                'cigar_tax': {'type': 'none'},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.40')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'RI': {  # Rhode Island
-                'cigarette_tax': Decimal('4.250'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.80'), 'cap': Decimal('0.50')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.07')
-            },
-            'SC': {  # South Carolina
-                'cigarette_tax': Decimal('0.570'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.055')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'SD': {  # South Dakota
-                'cigarette_tax': Decimal('1.530'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.35')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.045')
-            },
-            'TN': {  # Tennessee
-                'cigarette_tax': Decimal('0.620'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.066')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.07')
-            },
-            'TX': {  # Texas
-                'cigarette_tax': Decimal('1.410'),
-                'cigar_tax': {'type': 'per_unit', 'rate': Decimal('0.011')},
-                'vape_tax': None,
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0625')
-            },
-            'UT': {  # Utah
-                'cigarette_tax': Decimal('1.700'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.86')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.56')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.0485')
-            },
-            'VT': {  # Vermont
-                'cigarette_tax': Decimal('3.080'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.92'), 'cap_low': Decimal('2.00'), 'cap_high': Decimal('4.00')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.92')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'VA': {  # Virginia
-                'cigarette_tax': Decimal('0.600'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.066')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.053')
-            },
-            'WA': {  # Washington
-                'cigarette_tax': Decimal('3.025'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.95'), 'cap': Decimal('0.65')},
-                'vape_tax': {'type': 'bifurcated', 'open': Decimal('0.09'), 'closed': Decimal('0.27')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.065')
-            },
-            'WV': {  # West Virginia
-                'cigarette_tax': Decimal('1.200'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.12')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.075')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.06')
-            },
-            'WI': {  # Wisconsin
-                'cigarette_tax': Decimal('2.520'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.71'), 'cap': Decimal('0.50')},
-                'vape_tax': {'type': 'per_ml', 'rate': Decimal('0.05')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.05')
-            },
-            'WY': {  # Wyoming
-                'cigarette_tax': Decimal('0.600'),
-                'cigar_tax': {'type': 'percentage', 'rate': Decimal('0.20')},
-                'vape_tax': {'type': 'percentage', 'rate': Decimal('0.15')},
-                'sales_tax_applies': True,
-                'sales_tax_rate': Decimal('0.04')
-            }
-        }
+        return TAX_DATA
     
     def calculate_cigarette_tax(self, state: str, quantity: int = 1) -> Decimal:
         """Calculate cigarette excise tax for given state and quantity (packs)"""
-        if state not in self.tax_data:
-            return Decimal('0')
+        state_tax = self._state_taxes.get(state)
+        if state_tax is None:
+            return _D0
         
-        tax_per_pack = self.tax_data[state]['cigarette_tax']
-        return tax_per_pack * Decimal(str(quantity))
+        return state_tax.cigarette_rate * Decimal(quantity)
     
     def calculate_cigar_tax(self, state: str, wholesale_price: Decimal, quantity: int = 1) -> Decimal:
         """Calculate cigar excise tax for given state, price, and quantity"""
-        if state not in self.tax_data:
-            return Decimal('0')
-        
-        cigar_tax_info = self.tax_data[state]['cigar_tax']
+        state_tax = self._state_taxes.get(state)
+        if state_tax is None:
+            return _D0
         
-        if cigar_tax_info['type'] == 'none':
-            return Decimal('0')
-        
-        if cigar_tax_info['type'] == 'percentage':
-            tax_per_unit = wholesale_price * cigar_tax_info['rate']
-            
-            # Apply caps if they exist
-            if 'cap' in cigar_tax_info:
-                tax_per_unit = min(tax_per_unit, cigar_tax_info['cap'])
-            elif 'cap_low' in cigar_tax_info and 'cap_high' in cigar_tax_info:
-                # Vermont special case
-                if wholesale_price < Decimal('10'):
-                    tax_per_unit = min(tax_per_unit, cigar_tax_info['cap_low'])
-                else:
-                    tax_per_unit = min(tax_per_unit, cigar_tax_info['cap_high'])
-            
-            return tax_per_unit * Decimal(str(quantity))
-        
-        elif cigar_tax_info['type'] == 'per_unit':
-            return cigar_tax_info['rate'] * Decimal(str(quantity))
-        
-        return Decimal('0')
+        return state_tax.excise['cigars'](wholesale_price, quantity, None)
     
-    def calculate_vape_tax(self, state: str, product_type: str, price: Decimal = None, 
-                          volume_ml: Decimal = None, quantity: int = 1) -> Decimal:
+    def calculate_vape_tax(self, state: str, product_type: str, price: Optional[Decimal] = None, 
+                          volume_ml: Optional[Decimal] = None, quantity: int = 1) -> Decimal:
         """
         Calculate vape/e-cigarette tax
         product_type: 'open', 'closed', 'cartridge'
         price: wholesale or retail price depending on tax type
         volume_ml: volume in milliliters for per-ml taxes
         """
-        if state not in self.tax_data:
-            return Decimal('0')
-        
-        vape_tax_info = self.tax_data[state]['vape_tax']
-        
-        if not vape_tax_info:
-            return Decimal('0')
-        
-        if vape_tax_info['type'] == 'percentage':
-            if price:
-                return price * vape_tax_info['rate'] * Decimal(str(quantity))
-        
-        elif vape_tax_info['type'] == 'per_ml':
-            if volume_ml:
-                return volume_ml * vape_tax_info['rate'] * Decimal(str(quantity))
+        state_tax = self._state_taxes.get(state)
+        if state_tax is None:
+            return _D0
         
-        elif vape_tax_info['type'] == 'bifurcated':
-            if product_type == 'open' and 'open' in vape_tax_info:
-                if 'open' in vape_tax_info and isinstance(vape_tax_info['open'], Decimal):
-                    # Percentage rate
-                    if price:
-                        return price * vape_tax_info['open'] * Decimal(str(quantity))
-                    elif volume_ml:
-                        return volume_ml * vape_tax_info['open'] * Decimal(str(quantity))
-            elif product_type == 'closed' and 'closed' in vape_tax_info:
-                if isinstance(vape_tax_info['closed'], Decimal):
-                    if vape_tax_info['closed'] < Decimal('1'):  # Percentage
-                        if price:
-                            return price * vape_tax_info['closed'] * Decimal(str(quantity))
-                    else:  # Per unit or per mL
-                        if volume_ml:
-                            return volume_ml * vape_tax_info['closed'] * Decimal(str(quantity))
-                        else:
-                            return vape_tax_info['closed'] * Decimal(str(quantity))
-        
-        elif vape_tax_info['type'] == 'dual':
-            # California special case - both wholesale and retail tax
-            total_tax = Decimal('0')
-            if price and 'wholesale' in vape_tax_info:
-                total_tax += price * vape_tax_info['wholesale']
-            if price and 'retail' in vape_tax_info:
-                total_tax += price * vape_tax_info['retail']
-            return total_tax * Decimal(str(quantity))
-        
-        return Decimal('0')
+        vape_tax = state_tax.vape
+        return _VAPE_HANDLERS[vape_tax.tag](vape_tax, product_type, price, volume_ml, quantity)
     
     def calculate_sales_tax(self, state: str, taxable_amount: Decimal) -> Decimal:
         """Calculate sales tax if applicable in the state"""
-        if state not in self.tax_data:
-            return Decimal('0')
-        
-        if not self.tax_data[state]['sales_tax_applies']:
-            return Decimal('0')
+        state_tax = self._state_taxes.get(state)
+        if state_tax is None:
+            return _D0
         
-        return taxable_amount * self.tax_data[state]['sales_tax_rate']
+        return _sales_tax(state_tax, taxable_amount)
     
     def calculate_total_tax(self, state: str, product_type: str, base_price: Decimal,
-                           quantity: int = 1, volume_ml: Decimal = None) -> Dict[str, Decimal]:
+                           quantity: int = 1, volume_ml: Optional[Decimal] = None) -> Dict[str, Decimal]:
         """
         Calculate total tax burden for a tobacco product
         Returns breakdown of all applicable taxes
         """
-        taxes = {
-            'excise_tax': Decimal('0'),
-            'sales_tax': Decimal('0'),
-            'total_tax': Decimal('0')
+        # Fresh dict per call since callers add their own keys to it
+        return self._total_tax_cache(state, product_type, base_price, quantity, volume_ml).to_dict()
+    
+    def calculate_tax_breakdown(self, state: str, product_type: str, base_price: Decimal,
+                                quantity: int = 1, volume_ml: Optional[Decimal] = None) -> TaxBreakdown:
+        """Same as calculate_total_tax, but returns a shared, immutable TaxBreakdown tuple"""
+        return self._total_tax_cache(state, product_type, base_price, quantity, volume_ml)
+    
+    def calculate_total_tax_batch(self, state: str,
+                                  line_items: Iterable[Tuple[str, Decimal, int, Optional[Decimal]]]) -> List[Dict[str, Decimal]]:
+        """
+        Calculate total tax for many line items shipped to one state
+        line_items: (product_type, base_price, quantity, volume_ml) tuples
+        Returns one breakdown dict per line item, as calculate_total_tax would
+        """
+        total_tax_cache = self._total_tax_cache
+        return [
+            total_tax_cache(state, product_type, base_price, quantity, volume_ml).to_dict()
+            for product_type, base_price, quantity, volume_ml in line_items
+        ]
+    
+    def calculate_invoice_tax(self, state: str,
+                              line_items: Iterable[Tuple[str, Decimal, int, Optional[Decimal]]]) -> Dict[str, Decimal]:
+        """
+        Calculate summed taxes for a (possibly very large) wholesale invoice shipped to one state
+        line_items: (product_type, base_price, quantity, volume_ml) tuples
+        """
+        total_tax_cache = self._total_tax_cache
+        excise_total = sales_total = _D0
+        
+        # Large invoices repeat the same SKUs, so most lines are cache hits
+        for product_type, base_price, quantity, volume_ml in line_items:
+            tax_breakdown = total_tax_cache(state, product_type, base_price, quantity, volume_ml)
+            excise_total += tax_breakdown.excise
+            sales_total += tax_breakdown.sales
+        
+        return {
+            'excise_tax': excise_total,
+            'sales_tax': sales_total,
+            'total_tax': excise_total + sales_total
         }
+    
+    def _calculate_total_tax(self, state: str, product_type: str, base_price: Decimal,
+                             quantity: int, volume_ml: Optional[Decimal]) -> TaxBreakdown:
+        """Calculate the tax breakdown; memoized per instance as _total_tax_cache"""
+        # Resolve the state once for both the excise and the sales tax
+        state_tax = self._state_taxes.get(state)
+        if state_tax is None:
+            return _NO_TAX
         
         # Calculate excise tax based on product type
-        if product_type == 'cigarettes':
-            taxes['excise_tax'] = self.calculate_cigarette_tax(state, quantity)
-        elif product_type in ['cigars', 'cigar']:
-            taxes['excise_tax'] = self.calculate_cigar_tax(state, base_price, quantity)
-        elif product_type in ['vape', 'e-cigarette', 'vape_open', 'vape_closed']:
-            vape_type = 'open' if 'open' in product_type else 'closed'
-            taxes['excise_tax'] = self.calculate_vape_tax(state, vape_type, base_price, volume_ml, quantity)
+        excise = state_tax.excise.get(product_type)
+        excise_tax = excise(base_price, quantity, volume_ml) if excise is not None else _D0
         
         # Calculate sales tax on base price + excise tax
-        taxable_amount = base_price + taxes['excise_tax']
-        taxes['sales_tax'] = self.calculate_sales_tax(state, taxable_amount)
+        taxable_amount = base_price + excise_tax
+        sales_tax = _sales_tax(state_tax, taxable_amount)
         
         # Total tax burden
-        taxes['total_tax'] = taxes['excise_tax'] + taxes['sales_tax']
-        
-        return taxes
+        return TaxBreakdown(excise_tax, sales_tax, excise_tax + sales_tax)
     
     def get_state_info(self, state: str) -> Dict:
-        """Get complete tax information for a state"""
+        """Get complete tax information for a state (shared table entry - do not modify)"""
         return self.tax_data.get(state, {})
     
     def requires_wholesaler_license(self, state: str) -> bool:
         """Check if state requires wholesaler licensing (simplified - would need detailed research)"""
         # Most states require some form of tobacco wholesaler licensing
-        no_license_states = ['DE', 'MT', 'NH', 'OR']  # Simplified list
-        return state not in no_license_states
+        return state not in _NO_LICENSE_STATES
     
     def get_filing_requirements(self, state: str) -> Dict[str, str]:
-        """Get filing and reporting requirements (simplified)"""
+        """Get filing and reporting requirements (simplified; shared dict - do not modify)"""
         # This would need detailed research for each state
-        return {
-            'frequency': 'Monthly',  # Most common
-            'due_date': '20th of following month',  # Most common
-            'registration_required': 'Yes' if self.requires_wholesaler_license(state) else 'No',
-            'bond_required': 'Varies by state',
-            'notes': 'Consult state tobacco tax authority for specific requirements'
-        }
+        if self.requires_wholesaler_license(state):
+            return _FILING_REGISTRATION_REQUIRED
+        return _FILING_NO_REGISTRATION
+
+_calculator: Optional[StateTobaccoTax] = None
 
+def get_calculator() -> StateTobaccoTax:
+    """Get the process-wide calculator, so its memoized results are shared"""
+    global _calculator
+    if _calculator is None:
+        _calculator = StateTobaccoTax()
+    return _calculator
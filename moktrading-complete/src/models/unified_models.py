@@ -1,11 +1,33 @@
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import column_property, deferred
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from src.utils.file_upload import UPLOAD_URL_PREFIX
+from datetime import date
+from functools import lru_cache
+import base64
 import secrets
-import string
 
 db = SQLAlchemy()
 
+# Database-clock UTC stamp in the same 'YYYY-MM-DD HH:MM:SS.ffffff' form SQLAlchemy
+# binds datetimes in; SQLite's CURRENT_TIMESTAMP drops the fraction, which would
+# sort a stamp from the first second of a day before that day's midnight bound
+_UTC_NOW = db.func.strftime('%Y-%m-%d %H:%M:%f000', 'now')
+
+@lru_cache(maxsize=1)
+def _order_date_stamp(day):
+    """Date part of order numbers, formatted once per day"""
+    return day.strftime('%Y%m%d')
+
+@lru_cache(maxsize=1024)
+def _product_image_url(image_filename):
+    """Image URL for a product, built once per filename"""
+    if image_filename:
+        return UPLOAD_URL_PREFIX + image_filename
+    return '/static/images/no-image.png'
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -16,25 +38,40 @@ class User(db.Model):
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
     phone = db.Column(db.String(20))
-    address = db.Column(db.Text)
+    address = deferred(db.Column(db.Text))  # Only profile and checkout pages show it
     city = db.Column(db.String(50))
     state = db.Column(db.String(50))
     zip_code = db.Column(db.String(10))
     role = db.Column(db.String(20), default='customer')  # 'admin' or 'customer'
-    is_admin = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=_UTC_NOW)
+    
+    # Admin customer list filters on role and sorts newest first; its search
+    # box prefix-matches these columns with SQLite's case-insensitive LIKE
+    __table_args__ = (
+        db.Index('ix_users_role_created', 'role', 'created_at'),
+        db.Index('ix_users_first_name_nocase', first_name.collate('NOCASE')),
+        db.Index('ix_users_last_name_nocase', last_name.collate('NOCASE')),
+        db.Index('ix_users_email_nocase', email.collate('NOCASE')),
+        db.Index('ix_users_username_nocase', username.collate('NOCASE')),
+    )
     
     # Relationships
-    cart_items = db.relationship('CartItem', backref='user', lazy=True, cascade='all, delete-orphan')
-    orders = db.relationship('Order', backref='user', lazy=True)
+    cart_items = db.relationship('CartItem', back_populates='user', lazy=True, cascade='all, delete-orphan')
+    orders = db.relationship('Order', back_populates='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(
+            password, method=current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    @hybrid_property
+    def is_admin(self):
+        """Admin access follows the role; usable in queries as well"""
+        return self.role == 'admin'
+    
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -57,10 +94,10 @@ class Category(db.Model):
     name = db.Column(db.String(100), unique=True, nullable=False)
     description = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=_UTC_NOW)
     
     # Relationships
-    products = db.relationship('Product', backref='category', lazy=True)
+    products = db.relationship('Product', back_populates='category', lazy=True)
     
     def to_dict(self):
         return {
@@ -68,7 +105,7 @@ class Category(db.Model):
             'name': self.name,
             'description': self.description,
             'is_active': self.is_active,
-            'product_count': len(self.products) if self.products else 0
+            'product_count': self.product_count
         }
 
 class Product(db.Model):
@@ -77,6 +114,8 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
+    # Kept as Numeric/Decimal rather than integer cents: the tax code works in
+    # Decimal, and a cents column would not match existing databases
     price = db.Column(db.Numeric(10, 2), nullable=False)
     stock_quantity = db.Column(db.Integer, default=0)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False)
@@ -84,11 +123,20 @@ class Product(db.Model):
     image_filename = db.Column(db.String(255))
     is_active = db.Column(db.Boolean, default=True)
     is_featured = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=_UTC_NOW)
+    
+    # Category filter with newest-first sort, admin name search, and a partial
+    # index for the dashboard's low stock list
+    __table_args__ = (
+        db.Index('ix_products_category_created', 'category_id', 'created_at'),
+        db.Index('ix_products_name_nocase', name.collate('NOCASE')),
+        db.Index('ix_products_low_stock', 'stock_quantity', sqlite_where=db.text('stock_quantity <= 10')),
+    )
     
     # Relationships
-    cart_items = db.relationship('CartItem', backref='product', lazy=True)
-    order_items = db.relationship('OrderItem', backref='product', lazy=True)
+    category = db.relationship('Category', back_populates='products', lazy=True)
+    cart_items = db.relationship('CartItem', back_populates='product', lazy=True)
+    order_items = db.relationship('OrderItem', back_populates='product', lazy=True)
     
     @property
     def is_in_stock(self):
@@ -96,9 +144,7 @@ class Product(db.Model):
     
     @property
     def image_url(self):
-        if self.image_filename:
-            return f'/static/uploads/{self.image_filename}'
-        return '/static/images/no-image.png'
+        return _product_image_url(self.image_filename)
     
     def to_dict(self):
         return {
@@ -115,14 +161,32 @@ class Product(db.Model):
             'is_in_stock': self.is_in_stock
         }
 
+# Counted in the category SELECT itself instead of loading every product
+Category.product_count = column_property(
+    db.select(db.func.count(Product.id))
+    .where(Product.category_id == Category.id)
+    .correlate_except(Product)
+    .scalar_subquery()
+)
+
 class CartItem(db.Model):
     __tablename__ = 'cart_items'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False, default=1)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=_UTC_NOW, index=True)  # Stale cart cleanup
+    
+    # One row per product in a user's cart; also serves lookups by user_id alone
+    __table_args__ = (
+        db.Index('ix_cart_user_product', 'user_id', 'product_id', unique=True),
+    )
+    
+    # Relationships
+    user = db.relationship('User', back_populates='cart_items', lazy=True)
+    # Cart lines always display their product, so join it in with the item
+    product = db.relationship('Product', back_populates='cart_items', lazy='joined')
     
     @property
     def total_price(self):
@@ -141,7 +205,7 @@ class Order(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     status = db.Column(db.String(50), default='pending')
     
     # Pricing and Tax Fields
@@ -156,19 +220,30 @@ class Order(db.Model):
     
     payment_method = db.Column(db.String(50))
     payment_status = db.Column(db.String(50), default='pending')
-    shipping_address = db.Column(db.Text)
-    notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Only shown on order detail pages; load with undefer_group('detail')
+    shipping_address = deferred(db.Column(db.Text), group='detail')
+    notes = deferred(db.Column(db.Text), group='detail')
+    created_at = db.Column(db.DateTime, default=_UTC_NOW)
+    updated_at = db.Column(db.DateTime, default=_UTC_NOW, onupdate=_UTC_NOW)
+    
+    # Order history is listed newest first per customer; admin lists filter
+    # by status and/or sort by date
+    __table_args__ = (
+        db.Index('ix_orders_user_created', 'user_id', db.text('created_at DESC')),
+        db.Index('ix_orders_status_created', 'status', 'created_at'),
+        db.Index('ix_orders_created', 'created_at'),
+    )
     
     # Relationships
-    order_items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    user = db.relationship('User', back_populates='orders', lazy=True)
+    order_items = db.relationship('OrderItem', back_populates='order', lazy='selectin', cascade='all, delete-orphan')
     
     @staticmethod
     def generate_order_number():
         """Generate a unique order number"""
-        timestamp = datetime.now().strftime('%Y%m%d')
-        random_part = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(6))
+        timestamp = _order_date_stamp(date.today())
+        # Base32 of one urandom read; its A-Z/2-7 alphabet fits the old format
+        random_part = base64.b32encode(secrets.token_bytes(5)).decode()[:6]
         return f"MOK-{timestamp}-{random_part}"
     
     def to_dict(self):
@@ -192,11 +267,16 @@ class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)  # Price at time of order
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=_UTC_NOW)
+    
+    # Relationships
+    order = db.relationship('Order', back_populates='order_items', lazy=True)
+    # Order lines always display their product, so join it in with the item
+    product = db.relationship('Product', back_populates='order_items', lazy='joined')
     
     @property
     def total_price(self):
@@ -211,3 +291,45 @@ class OrderItem(db.Model):
             'total_price': float(self.total_price)
         }
 
+# Order lists show only how many items an order has, so count them in SQL
+# rather than loading the items
+Order.item_count = column_property(
+    db.select(db.func.count(OrderItem.id))
+    .where(OrderItem.order_id == Order.id)
+    .correlate_except(OrderItem)
+    .scalar_subquery()
+)
+
+class FailedNotification(db.Model):
+    """A notification every channel failed to send, kept for later retries"""
+    __tablename__ = 'failed_notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'))
+    notification_type = db.Column(db.String(50), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending or dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=_UTC_NOW)
+    
+    # The retry job picks up pending rows that are due
+    __table_args__ = (
+        db.Index('ix_failed_notifications_status_next', 'status', 'next_attempt_at'),
+    )
+
+class SentNotification(db.Model):
+    """An order notification that went out recently, so repeats of it are skipped"""
+    __tablename__ = 'sent_notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    notification_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    # Inserting a second row for the same notification fails, whichever worker tries it
+    __table_args__ = (
+        db.UniqueConstraint('order_id', 'notification_type', 'status', name='uq_sent_notifications_key'),
+    )
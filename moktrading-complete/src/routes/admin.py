@@ -1,32 +1,88 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app as app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app as app
 from flask_login import login_required, current_user
 from src.models.unified_models import db, Product, Category, Order, OrderItem, User, CartItem
 from src.utils.auth import admin_required
 from src.utils.file_upload import save_uploaded_file
 from src.utils.bulk_upload_simple import process_bulk_upload, validate_csv_headers
+from src.utils.background import run_in_background
+from src.utils.catalog import clear_catalog_cache, get_category_choices
+from src.utils.queries import seek_page
+import csv
+import io
 import os
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload, lazyload, load_only, selectinload, undefer_group
 
 admin_bp = Blueprint('admin', __name__)
 
+ORDER_STATUSES = frozenset(['pending', 'processing', 'shipped', 'delivered', 'cancelled'])
+MIDNIGHT = datetime.min.time()
+
+def order_list_options():
+    """Loader options for order list pages: only the columns their rows show"""
+    return (
+        load_only(Order.id, Order.order_number, Order.user_id, Order.status, Order.total_amount,
+                  Order.payment_method, Order.payment_status, Order.created_at, Order.item_count),
+        joinedload(Order.user).load_only(User.first_name, User.last_name, User.email),
+        lazyload(Order.order_items),
+    )
+
+def send_order_status_notification(order_id):
+    """Notify the customer and admin of an order's new status (background task)"""
+    from src.utils.notifications import notification_service
+    order = Order.query.options(
+        joinedload(Order.user),
+        selectinload(Order.order_items).joinedload(OrderItem.product)
+    ).get(order_id)
+    notification_service.send_order_status_update(order)
+
+def build_template_csv():
+    """Build the bulk upload CSV template"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    
+    # Write header
+    writer.writerow(['name', 'description', 'price', 'stock_quantity', 'category', 'brand'])
+    
+    # Write example rows
+    writer.writerow(['Example Product 1', 'Product description here', '19.99', '100', 'Cigarettes', 'Marlboro'])
+    writer.writerow(['Example Product 2', 'Another product description', '25.50', '50', 'Cigars', 'Cuban'])
+    
+    return output.getvalue().encode('utf-8')
+
+# The template never changes, so it is built once at import
+BULK_UPLOAD_TEMPLATE_CSV = build_template_csv()
+
+def prefix_pattern(search):
+    """LIKE pattern matching values that start with search (escape with '/')"""
+    escaped = search.replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return f'{escaped}%'
+
 @admin_bp.route('/dashboard')
 @admin_required
 def dashboard():
     """Admin dashboard with statistics"""
-    # Get statistics
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    total_customers = User.query.filter_by(is_admin=False).count()
-    
-    # Recent orders
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(5).all()
-    
-    # Revenue calculation
-    total_revenue = db.session.query(func.sum(Order.total_amount)).scalar() or 0
+    # Get statistics and revenue in a single round trip
+    stats = db.session.execute(db.select(
+        db.select(func.count(Product.id)).scalar_subquery().label('total_products'),
+        db.select(func.count(Order.id)).scalar_subquery().label('total_orders'),
+        db.select(func.count(User.id)).where(User.role == 'customer').scalar_subquery().label('total_customers'),
+        db.select(func.coalesce(func.sum(Order.total_amount), 0)).scalar_subquery().label('total_revenue')
+    )).one()
+    total_products, total_orders, total_customers, total_revenue = stats
+    
+    # Recent orders, loading only what the table shows
+    recent_orders = Order.query.options(
+        load_only(Order.id, Order.order_number, Order.total_amount, Order.status, Order.created_at),
+        joinedload(Order.user).load_only(User.first_name, User.last_name),
+        lazyload(Order.order_items)
+    ).order_by(Order.created_at.desc()).limit(5).all()
     
     # Low stock products
-    low_stock_products = Product.query.filter(Product.stock_quantity <= 10).all()
+    low_stock_products = Product.query.options(
+        load_only(Product.id, Product.name, Product.brand, Product.stock_quantity)
+    ).filter(Product.stock_quantity <= 10).all()
     
     return render_template('admin/dashboard.html',
                          total_products=total_products,
@@ -46,10 +102,10 @@ def products():
     category_filter = request.args.get('category', '')
     per_page = 20
     
-    query = Product.query
+    query = Product.query.options(joinedload(Product.category))
     
     if search:
-        query = query.filter(Product.name.contains(search))
+        query = query.filter(Product.name.like(prefix_pattern(search), escape='/'))
     
     if category_filter:
         query = query.filter_by(category_id=category_filter)
@@ -58,7 +114,7 @@ def products():
         page=page, per_page=per_page, error_out=False
     )
     
-    categories = Category.query.all()
+    categories = get_category_choices(active_only=False)
     
     return render_template('admin/products.html',
                          products=products,
@@ -71,7 +127,7 @@ def products():
 @admin_required
 def add_product():
     """Add new product"""
-    categories = Category.query.filter_by(is_active=True).all()
+    categories = get_category_choices()
     
     if request.method == 'POST':
         # Get form data
@@ -118,7 +174,6 @@ def add_product():
                     filename = save_uploaded_file(file, upload_folder)
                     if filename:
                         product.image_filename = filename
-                        product.image_url = f'/static/uploads/{filename}'
                 except ValueError as e:
                     flash(str(e), 'error')
                 except Exception as e:
@@ -127,6 +182,7 @@ def add_product():
         try:
             db.session.add(product)
             db.session.commit()
+            clear_catalog_cache()
             flash('Product added successfully!', 'success')
             return redirect(url_for('admin.products'))
         except Exception as e:
@@ -142,7 +198,7 @@ def add_product():
 def edit_product(product_id):
     """Edit existing product"""
     product = Product.query.get_or_404(product_id)
-    categories = Category.query.filter_by(is_active=True).all()
+    categories = get_category_choices()
     
     if request.method == 'POST':
         # Get form data
@@ -188,7 +244,6 @@ def edit_product(product_id):
                     filename = save_uploaded_file(file, upload_folder)
                     if filename:
                         product.image_filename = filename
-                        product.image_url = f'/static/uploads/{filename}'
                     flash('Image uploaded successfully!', 'success')
                 except ValueError as e:
                     flash(str(e), 'error')
@@ -197,6 +252,7 @@ def edit_product(product_id):
         
         try:
             db.session.commit()
+            clear_catalog_cache()
             flash('Product updated successfully!', 'success')
             return redirect(url_for('admin.products'))
         except Exception as e:
@@ -226,6 +282,7 @@ def bulk_upload():
             try:
                 result = process_bulk_upload(file)
                 if result['success']:
+                    clear_catalog_cache()
                     flash(f'Successfully uploaded {result["added"]} products!', 'success')
                     if result['errors']:
                         flash(f'Skipped {len(result["errors"])} rows with errors', 'warning')
@@ -245,23 +302,24 @@ def bulk_upload():
 @admin_required
 def orders():
     """Admin orders management page"""
-    page = request.args.get('page', 1, type=int)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
     status_filter = request.args.get('status', '')
     per_page = 20
     
-    query = Order.query
+    query = Order.query.options(*order_list_options())
     
     if status_filter:
         query = query.filter_by(status=status_filter)
     
-    orders = query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Get order statistics in one grouped query
+    status_counts = dict(db.session.query(Order.status, func.count(Order.id)).group_by(Order.status).all())
+    total_orders = sum(status_counts.values())
+    pending_orders = status_counts.get('pending', 0)
+    completed_orders = status_counts.get('completed', 0)
     
-    # Get order statistics
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    completed_orders = Order.query.filter_by(status='completed').count()
+    # Ids grow with created_at, so seeking on the primary key pages newest first
+    orders = seek_page(query, Order, after=after, before=before, per_page=per_page)
     
     return render_template('admin/orders.html',
                          orders=orders,
@@ -275,7 +333,11 @@ def orders():
 @admin_required
 def order_detail(order_id):
     """View order details"""
-    order = Order.query.get_or_404(order_id)
+    order = Order.query.options(
+        undefer_group('detail'),
+        joinedload(Order.user),
+        selectinload(Order.order_items).joinedload(OrderItem.product)
+    ).get_or_404(order_id)
     return render_template('admin/order_detail.html',
                          order=order,
                          page_title=f'Order #{order.id} - MokTrading')
@@ -284,27 +346,24 @@ def order_detail(order_id):
 @admin_required
 def update_order_status(order_id):
     """Update order status"""
-    order = Order.query.get_or_404(order_id)
     new_status = request.form.get('status')
     
-    if new_status in ['pending', 'processing', 'shipped', 'delivered', 'cancelled']:
-        order.status = new_status
-        
+    if new_status in ORDER_STATUSES:
         try:
+            # Update in place without loading the order first
+            updated = Order.query.filter_by(id=order_id).update({'status': new_status})
             db.session.commit()
-            flash(f'Order status updated to {new_status}', 'success')
-            
-            # Send notification to customer and admin
-            try:
-                from src.utils.notifications import NotificationService
-                notification_service = NotificationService()
-                notification_service.send_order_status_update(order)
-            except Exception as e:
-                pass  # Don't fail if notification fails
-                
         except Exception as e:
             db.session.rollback()
             flash('Error updating order status', 'error')
+            return redirect(url_for('admin.order_detail', order_id=order_id))
+        
+        if not updated:
+            abort(404)
+        flash(f'Order status updated to {new_status}', 'success')
+        
+        # Send notification to customer and admin after the response is on its way
+        run_in_background(send_order_status_notification, order_id)
     else:
         flash('Invalid status', 'error')
     
@@ -314,35 +373,30 @@ def update_order_status(order_id):
 @admin_required
 def completed_orders():
     """Admin completed orders page with filtering options"""
-    from datetime import datetime, timedelta
-    from sqlalchemy import and_, func
-    
     # Get filter parameters
     filter_type = request.args.get('filter', 'all')  # all, today, week, month, custom
     start_date = request.args.get('start_date', '')
     end_date = request.args.get('end_date', '')
-    page = request.args.get('page', 1, type=int)
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
     per_page = 20
     
     # Base query for completed orders
     query = Order.query.filter_by(status='completed')
     
-    # Apply date filters
+    # Apply date filters as [first day, day after last day)
     today = datetime.now().date()
+    first_day = next_day = None
     
     if filter_type == 'today':
-        start_datetime = datetime.combine(today, datetime.min.time())
-        end_datetime = datetime.combine(today, datetime.max.time())
-        query = query.filter(and_(Order.created_at >= start_datetime, Order.created_at <= end_datetime))
+        first_day, next_day = today, today + timedelta(days=1)
         filter_label = f"Today ({today.strftime('%Y-%m-%d')})"
         
     elif filter_type == 'week':
         # Current week (Monday to Sunday)
         week_start = today - timedelta(days=today.weekday())
         week_end = week_start + timedelta(days=6)
-        start_datetime = datetime.combine(week_start, datetime.min.time())
-        end_datetime = datetime.combine(week_end, datetime.max.time())
-        query = query.filter(and_(Order.created_at >= start_datetime, Order.created_at <= end_datetime))
+        first_day, next_day = week_start, week_end + timedelta(days=1)
         filter_label = f"This Week ({week_start.strftime('%m/%d')} - {week_end.strftime('%m/%d')})"
         
     elif filter_type == 'month':
@@ -352,46 +406,46 @@ def completed_orders():
             next_month = today.replace(year=today.year + 1, month=1, day=1)
         else:
             next_month = today.replace(month=today.month + 1, day=1)
-        month_end = next_month - timedelta(days=1)
-        start_datetime = datetime.combine(month_start, datetime.min.time())
-        end_datetime = datetime.combine(month_end, datetime.max.time())
-        query = query.filter(and_(Order.created_at >= start_datetime, Order.created_at <= end_datetime))
+        first_day, next_day = month_start, next_month
         filter_label = f"This Month ({month_start.strftime('%B %Y')})"
         
     elif filter_type == 'custom' and start_date and end_date:
         try:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-            start_datetime = datetime.combine(start_date_obj, datetime.min.time())
-            end_datetime = datetime.combine(end_date_obj, datetime.max.time())
-            query = query.filter(and_(Order.created_at >= start_datetime, Order.created_at <= end_datetime))
+            first_day, next_day = start_date_obj, end_date_obj + timedelta(days=1)
             filter_label = f"Custom ({start_date} to {end_date})"
         except ValueError:
             filter_label = "All Completed Orders"
     else:
         filter_label = "All Completed Orders"
     
+    if first_day is not None:
+        query = query.filter(Order.created_at >= datetime.combine(first_day, MIDNIGHT),
+                             Order.created_at < datetime.combine(next_day, MIDNIGHT))
+    
     # Get paginated orders
-    orders = query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    orders = seek_page(query.options(*order_list_options()),
+                       Order, after=after, before=before, per_page=per_page)
     
-    # Calculate totals for the filtered period
-    filtered_orders = query.all()
-    total_orders = len(filtered_orders)
-    total_revenue = sum(order.total_amount for order in filtered_orders)
-    cash_total = sum(order.total_amount for order in filtered_orders if order.payment_method == 'cash')
-    credit_total = sum(order.total_amount for order in filtered_orders if order.payment_method in ['card', 'credit'])
-    check_total = sum(order.total_amount for order in filtered_orders if order.payment_method == 'check')
-    next_time_total = sum(order.total_amount for order in filtered_orders if order.payment_method == 'next_time')
+    # Calculate totals for the filtered period, one row per payment method
+    totals_by_method = query.with_entities(
+        Order.payment_method,
+        func.count(Order.id),
+        func.coalesce(func.sum(Order.total_amount), 0)
+    ).group_by(Order.payment_method).all()
     
     # Payment method breakdown
-    payment_breakdown = {
-        'cash': cash_total,
-        'credit': credit_total,
-        'check': check_total,
-        'next_time': next_time_total
-    }
+    payment_breakdown = {'cash': 0, 'credit': 0, 'check': 0, 'next_time': 0}
+    total_orders = 0
+    total_revenue = 0
+    for payment_method, order_count, method_total in totals_by_method:
+        total_orders += order_count
+        total_revenue += method_total
+        if payment_method in ['card', 'credit']:
+            payment_breakdown['credit'] += method_total
+        elif payment_method in payment_breakdown:
+            payment_breakdown[payment_method] += method_total
     
     # Calculate average order value
     avg_order_value = total_revenue / max(total_orders, 1)
@@ -416,14 +470,15 @@ def customers():
     search = request.args.get('search', '')
     per_page = 20
     
-    query = User.query.filter_by(is_admin=False)
+    query = User.query.filter_by(role='customer')
     
     if search:
+        pattern = prefix_pattern(search)
         query = query.filter(
-            (User.first_name.contains(search)) |
-            (User.last_name.contains(search)) |
-            (User.email.contains(search)) |
-            (User.username.contains(search))
+            (User.first_name.like(pattern, escape='/')) |
+            (User.last_name.like(pattern, escape='/')) |
+            (User.email.like(pattern, escape='/')) |
+            (User.username.like(pattern, escape='/'))
         )
     
     customers = query.order_by(User.created_at.desc()).paginate(
@@ -457,8 +512,7 @@ def add_category():
             return redirect(url_for('admin.add_category'))
         
         # Check if category already exists
-        existing = Category.query.filter_by(name=name).first()
-        if existing:
+        if db.session.query(Category.query.filter_by(name=name).exists()).scalar():
             flash('Category with this name already exists', 'error')
             return redirect(url_for('admin.add_category'))
         
@@ -471,6 +525,7 @@ def add_category():
         try:
             db.session.add(category)
             db.session.commit()
+            clear_catalog_cache()
             flash('Category added successfully!', 'success')
             return redirect(url_for('admin.categories'))
         except Exception as e:
@@ -496,8 +551,7 @@ def edit_category(category_id):
             return redirect(url_for('admin.edit_category', category_id=category_id))
         
         # Check if category name already exists (excluding current category)
-        existing = Category.query.filter(Category.name == name, Category.id != category_id).first()
-        if existing:
+        if db.session.query(Category.query.filter(Category.name == name, Category.id != category_id).exists()).scalar():
             flash('Category with this name already exists', 'error')
             return redirect(url_for('admin.edit_category', category_id=category_id))
         
@@ -507,6 +561,7 @@ def edit_category(category_id):
         
         try:
             db.session.commit()
+            clear_catalog_cache()
             flash('Category updated successfully!', 'success')
             return redirect(url_for('admin.categories'))
         except Exception as e:
@@ -523,14 +578,15 @@ def delete_category(category_id):
     """Delete category"""
     category = Category.query.get_or_404(category_id)
     
-    # Check if category has products
-    if category.products:
+    # Check if category has products without loading them
+    if db.session.query(Product.query.filter_by(category_id=category.id).exists()).scalar():
         flash('Cannot delete category with products. Move products to another category first.', 'error')
         return redirect(url_for('admin.categories'))
     
     try:
         db.session.delete(category)
         db.session.commit()
+        clear_catalog_cache()
         flash('Category deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -549,19 +605,26 @@ def financial_dashboard():
     week_start = today - timedelta(days=today.weekday())
     week_end = week_start + timedelta(days=6)
     
-    # Weekly totals
-    weekly_orders = Order.query.filter(Order.created_at >= week_start).all()
+    # Weekly totals in one conditional aggregate
+    weekly = Order.query.filter(Order.created_at >= week_start)
+    totals = weekly.with_entities(
+        func.count(Order.id).label('order_count'),
+        func.coalesce(func.sum(case((Order.payment_method == 'cash', Order.total_amount), else_=0)), 0).label('cash'),
+        func.coalesce(func.sum(case((Order.payment_method.in_(['credit', 'card']), Order.total_amount), else_=0)), 0).label('credit'),
+        func.coalesce(func.sum(case((Order.payment_status != 'paid', Order.total_amount), else_=0)), 0).label('unpaid')
+    ).one()
     
-    cash_total = sum(order.total_amount for order in weekly_orders if order.payment_method == 'cash')
-    credit_total = sum(order.total_amount for order in weekly_orders if order.payment_method in ['credit', 'card'])
-    unpaid_total = sum(order.total_amount for order in weekly_orders if order.payment_status != 'paid')
+    # The page lists only the latest few orders of the week
+    weekly_orders = weekly.options(*order_list_options()).order_by(
+        Order.created_at.desc()).limit(10).all()
     
     return render_template('admin/financial_dashboard.html',
-                         cash_payments=cash_total,
-                         credit_payments=credit_total,
-                         unpaid_amount=unpaid_total,
-                         monthly_revenue=cash_total + credit_total,
+                         cash_payments=totals.cash,
+                         credit_payments=totals.credit,
+                         unpaid_amount=totals.unpaid,
+                         monthly_revenue=totals.cash + totals.credit,
                          weekly_orders=weekly_orders,
+                         weekly_order_count=totals.order_count,
                          week_start=week_start,
                          week_end=week_end,
                          page_title='Financial Dashboard - MokTrading')
@@ -571,25 +634,9 @@ def financial_dashboard():
 @admin_required
 def download_template():
     """Download CSV template for bulk upload"""
-    import io
-    import csv
-    from flask import make_response
-    
-    # Create CSV template
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['name', 'description', 'price', 'stock_quantity', 'category', 'brand'])
-    
-    # Write example rows
-    writer.writerow(['Example Product 1', 'Product description here', '19.99', '100', 'Cigarettes', 'Marlboro'])
-    writer.writerow(['Example Product 2', 'Another product description', '25.50', '50', 'Cigars', 'Cuban'])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = 'attachment; filename=product_template.csv'
-    
-    return response
+    return app.response_class(
+        BULK_UPLOAD_TEMPLATE_CSV,
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=product_template.csv'}
+    )
 
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
 from src.models.unified_models import db, User
 from src.utils.auth import login_user, logout_user, login_required
+from sqlalchemy.orm import load_only
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -78,7 +79,7 @@ def register():
             errors.append('First name and last name are required.')
         
         # Check if username or email already exists
-        existing_user = User.query.filter(
+        existing_user = User.query.options(load_only(User.username, User.email)).filter(
             (User.username == username) | (User.email == email)
         ).first()
         
@@ -1,17 +1,56 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response, current_app
 from src.models.unified_models import db, Product, Category, CartItem, Order, OrderItem
 from src.utils.auth import login_required, get_current_user
+from src.utils.background import run_in_background
+from src.utils.cart import get_cart_count, reset_cart_count
+from src.utils.catalog import catalog_cache, get_featured_products
+from src.utils.queries import query_budget
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, lazyload, raiseload, selectinload, undefer_group
 from decimal import Decimal
 
 customer_bp = Blueprint('customer', __name__)
 
+HOME_CACHE_SECONDS = 60
+
+def eager_options(*options):
+    """Loader options for list pages; in debug any other lazy load raises"""
+    if current_app.debug:
+        return (*options, raiseload('*'))
+    return options
+
+def send_new_order_notification(order_id):
+    """Notify the admin of a newly placed order (background task)"""
+    from src.utils.notifications import notification_service
+    order = Order.query.options(
+        joinedload(Order.user),
+        selectinload(Order.order_items).joinedload(OrderItem.product)
+    ).get(order_id)
+    notification_service.send_order_notification(order, "new_order")
+
 @customer_bp.route('/')
 def home():
     """Customer home page"""
+    # Anonymous visitors without pending flash messages all get the same page
+    if 'user_id' in session or '_flashes' in session:
+        return render_home()
+    
+    response = make_response(render_anonymous_home())
+    response.cache_control.public = True
+    response.cache_control.max_age = HOME_CACHE_SECONDS
+    response.vary.add('Cookie')
+    return response
+
+@catalog_cache(HOME_CACHE_SECONDS)
+def render_anonymous_home():
+    """Rendered home page for anonymous visitors"""
+    return render_home()
+
+def render_home():
+    """Render the home page for the current visitor"""
     # Get featured products
-    featured_products = Product.query.filter_by(is_featured=True, is_active=True).limit(8).all()
-    if not featured_products:
-        featured_products = Product.query.filter_by(is_active=True).order_by(Product.created_at.desc()).limit(8).all()
+    featured_products = get_featured_products()
     
     # Get categories
     categories = Category.query.filter_by(is_active=True).all()
@@ -22,6 +61,7 @@ def home():
                          page_title='Premium Tobacco Products - MokTrading')
 
 @customer_bp.route('/products')
+@query_budget(5)
 def products():
     """Product catalog page"""
     category_id = request.args.get('category', type=int)
@@ -91,12 +131,15 @@ def product_detail(product_id):
 
 @customer_bp.route('/cart')
 @login_required
+@query_budget(4)
 def cart():
     """Shopping cart page with tax calculations"""
     from src.utils.tax_calculator import tax_calculator
     
     user = get_current_user()
-    cart_items = CartItem.query.filter_by(user_id=user.id).all()
+    cart_items = CartItem.query.filter_by(user_id=user.id).options(
+        *eager_options(joinedload(CartItem.product).joinedload(Product.category))
+    ).all()
     
     # Get user's state for tax calculation (default to Delaware if not set)
     user_state = user.state if user.state else 'DE'
@@ -198,23 +241,35 @@ def add_to_cart():
             flash(message, 'error')
             return redirect(request.referrer or url_for('customer.products'))
         
-        # Check if item already in cart
-        existing_item = CartItem.query.filter_by(user_id=user.id, product_id=product_id).first()
-        
-        if existing_item:
-            new_quantity = existing_item.quantity + quantity
-            if new_quantity > product.stock_quantity:
-                message = f'Cannot add more items. Only {product.stock_quantity} available.'
-                if request.is_json:
-                    return jsonify({'success': False, 'message': message})
-                flash(message, 'error')
-                return redirect(request.referrer or url_for('customer.products'))
-            existing_item.quantity = new_quantity
-        else:
-            cart_item = CartItem(user_id=user.id, product_id=product_id, quantity=quantity)
-            db.session.add(cart_item)
-        
-        db.session.commit()
+        # A concurrent add of the same product can insert its cart row between
+        # the check and the commit; the unique index rejects the second insert
+        # and the add is retried as a quantity update
+        for attempt in range(2):
+            # Check if item already in cart
+            existing_item = CartItem.query.filter_by(user_id=user.id, product_id=product_id).first()
+            
+            if existing_item:
+                new_quantity = existing_item.quantity + quantity
+                if new_quantity > product.stock_quantity:
+                    message = f'Cannot add more items. Only {product.stock_quantity} available.'
+                    if request.is_json:
+                        return jsonify({'success': False, 'message': message})
+                    flash(message, 'error')
+                    return redirect(request.referrer or url_for('customer.products'))
+                existing_item.quantity = new_quantity
+            else:
+                cart_item = CartItem(user_id=user.id, product_id=product_id, quantity=quantity)
+                db.session.add(cart_item)
+            
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+        
+        reset_cart_count()
         success_message = f'{product.name} added to cart successfully!'
         
         if request.is_json:
@@ -276,6 +331,7 @@ def update_cart():
             message = 'Cart updated.'
         
         db.session.commit()
+        reset_cart_count()
         
         # Calculate new totals with tax
         cart_items = CartItem.query.filter_by(user_id=user.id).all()
@@ -297,7 +353,7 @@ def update_cart():
         if cart_items:
             from src.utils.tax_calculator import tax_calculator
             cart_data = [{'product': item.product, 'quantity': item.quantity} for item in cart_items]
-            tax_summary = tax_calculator.calculate_cart_tax(cart_data, user_state)
+            tax_summary = tax_calculator.calculate_cart_totals(cart_data, user_state)
             cart_total = float(tax_summary['grand_total'])
         
         if request.is_json:
@@ -359,6 +415,7 @@ def remove_from_cart(item_id=None):
     try:
         db.session.delete(cart_item)
         db.session.commit()
+        reset_cart_count()
         
         # Calculate new cart total
         cart_items = CartItem.query.filter_by(user_id=user.id).all()
@@ -477,7 +534,7 @@ def process_checkout():
         
         # Calculate taxes
         cart_data = [{'product': item.product, 'quantity': item.quantity} for item in cart_items]
-        tax_summary = tax_calculator.calculate_cart_tax(cart_data, user_state)
+        tax_summary = tax_calculator.calculate_cart_totals(cart_data, user_state)
         
         # Create order with tax information
         order = Order(
@@ -517,34 +574,33 @@ def process_checkout():
         db.session.flush()  # Get order ID
         
         # Create order items and update stock
+        order_items = []
         for cart_item in cart_items:
             if cart_item.quantity > cart_item.product.stock_quantity:
                 raise Exception(f'Insufficient stock for {cart_item.product.name}')
             
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-            db.session.add(order_item)
+            order_items.append({
+                'order_id': order.id,
+                'product_id': cart_item.product_id,
+                'quantity': cart_item.quantity,
+                'price': cart_item.product.price
+            })
             
             # Update stock
             cart_item.product.stock_quantity -= cart_item.quantity
         
+        db.session.execute(insert(OrderItem), order_items)  # Single executemany
+        db.session.expire(order, ['order_items'])
+        
         # Clear cart
         for cart_item in cart_items:
             db.session.delete(cart_item)
         
         db.session.commit()
+        reset_cart_count()
         
-        # Send order notification to admin
-        try:
-            from src.utils.notifications import NotificationService
-            notification_service = NotificationService()
-            notification_service.send_order_notification(order, "new_order")
-        except Exception as e:
-            print(f"Notification error: {str(e)}")  # Log but don't fail the order
+        # Notify the admin without holding up the response
+        run_in_background(send_new_order_notification, order.id)
         
         flash(f'Order {order.order_number} placed successfully!', 'success')
         return redirect(url_for('customer.order_detail', order_id=order.id))
@@ -556,13 +612,16 @@ def process_checkout():
 
 @customer_bp.route('/orders')
 @login_required
+@query_budget(4)
 def orders():
     """Order history page"""
     user = get_current_user()
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).paginate(
+    orders = Order.query.filter_by(user_id=user.id).options(
+        *eager_options(lazyload(Order.order_items))
+    ).order_by(Order.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
@@ -573,10 +632,11 @@ def orders():
 @customer_bp.route('/orders/<int:order_id>')
 @customer_bp.route('/order/<int:order_id>')
 @login_required
+@query_budget(4)
 def order_detail(order_id):
     """Order detail page"""
     user = get_current_user()
-    order = Order.query.filter_by(id=order_id, user_id=user.id).first_or_404()
+    order = Order.query.filter_by(id=order_id, user_id=user.id).options(undefer_group('detail')).first_or_404()
     
     return render_template('customer/order_detail.html',
                          order=order,
@@ -587,7 +647,9 @@ def order_detail(order_id):
 def account():
     """Customer account page"""
     user = get_current_user()
-    recent_orders = Order.query.filter_by(user_id=user.id).order_by(Order.created_at.desc()).limit(5).all()
+    recent_orders = Order.query.filter_by(user_id=user.id).options(
+        lazyload(Order.order_items)
+    ).order_by(Order.created_at.desc()).limit(5).all()
     
     return render_template('customer/account.html',
                          user=user,
@@ -605,6 +667,7 @@ def clear_cart():
         # Delete all cart items for the user
         CartItem.query.filter_by(user_id=user.id).delete()
         db.session.commit()
+        reset_cart_count()
         
         if request.is_json:
             return jsonify({
@@ -627,7 +690,5 @@ def clear_cart():
 @login_required
 def cart_count():
     """Get cart item count"""
-    user = get_current_user()
-    count = CartItem.query.filter_by(user_id=user.id).count()
-    return jsonify({'count': count})
+    return jsonify({'count': get_cart_count()})
 
@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash, request, jsonify
+from flask import g, session, redirect, url_for, flash, request, jsonify
 
 def login_required(f):
     """Decorator to require user login"""
@@ -33,11 +33,11 @@ def admin_required(f):
     return decorated_function
 
 def get_current_user():
-    """Get current user from session"""
-    from src.models.unified_models import User
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    """Get current user from session, loaded at most once per request"""
+    if 'current_user' not in g:
+        from src.models.unified_models import User
+        g.current_user = User.query.get(session['user_id']) if 'user_id' in session else None
+    return g.current_user
 
 def login_user(user):
     """Log in a user by setting session variables"""
@@ -45,10 +45,13 @@ def login_user(user):
     session['username'] = user.username
     session['is_admin'] = user.is_admin
     session['full_name'] = user.full_name
+    session.pop('cart_count', None)
+    g.pop('current_user', None)
 
 def logout_user():
     """Log out the current user by clearing session"""
     session.clear()
+    g.pop('current_user', None)
 
 def is_logged_in():
     """Check if user is logged in"""
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Small shared pool for slow I/O (email, webhooks) that should not hold up a response
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='background')
+
+def run_in_background(func, *args):
+    """
+    Run func(*args) on the background pool inside an app context
+
+    Pass ids rather than ORM objects; the task gets its own database session
+    and should load what it needs. Failures are logged, never raised.
+    """
+    app = current_app._get_current_object()
+
+    def task():
+        with app.app_context():
+            try:
+                func(*args)
+            except Exception:
+                logger.exception('Background task %s failed', func.__name__)
+
+    return _executor.submit(task)
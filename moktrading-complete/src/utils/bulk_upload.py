@@ -1,15 +1,154 @@
 import pandas as pd
 import os
 from werkzeug.utils import secure_filename
+from sqlalchemy import insert
 from src.models.unified_models import Product, Category, db
+from src.utils.file_upload import SAVE_BUFFER_SIZE
 from flask import current_app
 
-ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+try:
+    import python_calamine  # noqa: F401  Rust-backed reader, much faster than openpyxl
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = None  # pandas default: openpyxl for .xlsx, xlrd for .xls
+
+ALLOWED_EXTENSIONS = frozenset({'csv', 'xlsx', 'xls'})
+REQUIRED_COLUMNS = ['Name', 'Price', 'Category', 'Stock']
+UPLOAD_COLUMNS = {'Name', 'Price', 'Category', 'Stock', 'Description', 'Brand'}
+# Read text columns as str so pandas skips type inference on them per chunk
+TEXT_COLUMN_DTYPES = {'Name': str, 'Category': str, 'Description': str, 'Brand': str}
+CHUNK_SIZE = 5000  # Rows read, validated and committed at a time
+READ_OPTIONS = {'dtype': TEXT_COLUMN_DTYPES, 'usecols': UPLOAD_COLUMNS.__contains__}
+PRODUCT_INSERT = insert(Product).returning(Product.name, Product.id)
 
 def allowed_file(filename):
     """Check if file extension is allowed for bulk upload"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    dot = filename.rfind('.')
+    return dot != -1 and filename[dot + 1:].lower() in ALLOWED_EXTENSIONS
+
+def text_column(df, column):
+    """Stripped text of a column with blanks for missing cells; all blank if absent"""
+    if column not in df:
+        return pd.Series('', index=df.index)
+    return df[column].fillna('').astype(str).str.strip()
+
+def import_product_rows(df, results, seen_names, category_ids):
+    """Validate one chunk of upload rows and insert its new products"""
+    products_data = []
+    imported_products = []
+    
+    # Clean each column once so the row loop only reads values
+    df = pd.DataFrame({
+        'Name': text_column(df, 'Name'),
+        'Price': pd.to_numeric(df['Price'], errors='coerce'),
+        'Category': text_column(df, 'Category'),
+        'Stock': pd.to_numeric(df['Stock'], errors='coerce'),
+        'Description': text_column(df, 'Description'),
+        'Brand': text_column(df, 'Brand'),
+    })
+    
+    # Look up every category and existing product named in the chunk at once
+    names = set(df['Name'])
+    category_names = set(df['Category']) - category_ids.keys()
+    existing_names = set(db.session.scalars(db.select(Product.name).where(Product.name.in_(names))))
+    category_ids.update(db.session.execute(
+        db.select(Category.name, Category.id).where(Category.name.in_(category_names))).all())
+    
+    rows = df.itertuples(name=None)  # Plain (index, *columns) tuples, no Series per row
+    for index, name, price, category_name, stock, description, brand in rows:
+        try:
+            # Validate data
+            if not name:
+                results['errors'].append(f'Row {index + 2}: Product name is required')
+                continue
+            
+            if pd.isna(price):
+                results['errors'].append(f'Row {index + 2}: Price must be a valid number')
+                continue
+            
+            if price <= 0:
+                results['errors'].append(f'Row {index + 2}: Price must be greater than 0')
+                continue
+            
+            if pd.isna(stock):
+                results['errors'].append(f'Row {index + 2}: Stock must be a valid integer')
+                continue
+            
+            stock = int(stock)
+            if stock < 0:
+                results['errors'].append(f'Row {index + 2}: Stock cannot be negative')
+                continue
+            
+            if not category_name:
+                results['errors'].append(f'Row {index + 2}: Category is required')
+                continue
+            
+            # Find or create category
+            category_id = category_ids.get(category_name)
+            if category_id is None:
+                # Create new category
+                category = Category(
+                    name=category_name,
+                    description=f'Auto-created category for {category_name}',
+                    is_active=True
+                )
+                db.session.add(category)
+                db.session.flush()  # Get the ID
+                category_id = category_ids[category_name] = category.id
+            
+            # Check if product already exists, in the database or earlier in this file
+            if name in seen_names or name in existing_names:
+                results['errors'].append(f'Row {index + 2}: Product "{name}" already exists')
+                continue
+            
+            # Queue new product for the bulk insert
+            seen_names.add(name)
+            products_data.append({
+                'name': name,
+                'description': description,
+                'price': price,
+                'stock_quantity': stock,
+                'category_id': category_id,
+                'brand': brand,
+                'is_active': True,
+                'is_featured': False
+            })
+            results['successful_imports'] += 1
+            imported_products.append({
+                'name': name,
+                'price': price,
+                'category': category_name,
+                'stock': stock
+            })
+            
+        except ValueError as e:
+            results['errors'].append(f'Row {index + 2}: Invalid data format - {str(e)}')
+        except Exception as e:
+            results['errors'].append(f'Row {index + 2}: Error processing row - {str(e)}')
+    
+    # Insert the chunk's products and commit them together; RETURNING gives
+    # the new ids for the report in the same statement
+    if products_data:
+        product_ids = dict(db.session.execute(PRODUCT_INSERT, products_data).all())
+        db.session.commit()
+        for product in imported_products:
+            product['id'] = product_ids[product['name']]
+        results['imported_products'].extend(imported_products)
+
+def read_csv_chunks(filepath):
+    """Read a CSV upload CHUNK_SIZE rows at a time"""
+    return pd.read_csv(filepath, chunksize=CHUNK_SIZE, **READ_OPTIONS)
+
+def read_excel_chunks(filepath):
+    """Read an Excel upload as a single chunk; pandas cannot read it in parts"""
+    return [pd.read_excel(filepath, engine=EXCEL_ENGINE, **READ_OPTIONS)]
+
+# Chunk reader for each allowed upload extension
+CHUNK_READERS = {
+    'csv': read_csv_chunks,
+    'xlsx': read_excel_chunks,
+    'xls': read_excel_chunks,
+}
 
 def process_bulk_upload(file, upload_folder):
     """
@@ -18,6 +157,8 @@ def process_bulk_upload(file, upload_folder):
     Expected columns: Name, Price, Category, Stock
     Optional columns: Description, Brand
     
+    CSV files are read and committed CHUNK_SIZE rows at a time.
+    
     Returns:
         dict: Results with success count, errors, and details
     """
@@ -32,110 +173,41 @@ def process_bulk_upload(file, upload_folder):
     filepath = os.path.join(upload_folder, filename)
     
     try:
-        file.save(filepath)
+        file.save(filepath, buffer_size=SAVE_BUFFER_SIZE)
         
         # Read file based on extension
-        file_ext = filename.rsplit('.', 1)[1].lower()
-        
-        if file_ext == 'csv':
-            df = pd.read_csv(filepath)
-        elif file_ext in ['xlsx', 'xls']:
-            df = pd.read_excel(filepath)
-        else:
+        read_chunks = CHUNK_READERS.get(filename.rpartition('.')[2].lower())
+        if read_chunks is None:
             return {'success': False, 'error': 'Unsupported file format'}
+        chunks = read_chunks(filepath)
         
-        # Validate required columns
-        required_columns = ['Name', 'Price', 'Category', 'Stock']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            return {
-                'success': False, 
-                'error': f'Missing required columns: {", ".join(missing_columns)}. Required: Name, Price, Category, Stock'
-            }
-        
-        # Process each row
         results = {
             'success': True,
-            'total_rows': len(df),
+            'total_rows': 0,
             'successful_imports': 0,
             'errors': [],
             'imported_products': []
         }
+        seen_names = set()
+        category_ids = {}
         
-        for index, row in df.iterrows():
-            try:
-                # Extract data from row
-                name = str(row['Name']).strip()
-                price = float(row['Price'])
-                category_name = str(row['Category']).strip()
-                stock = int(row['Stock'])
-                
-                # Optional fields
-                description = str(row.get('Description', '')).strip() if pd.notna(row.get('Description')) else ''
-                brand = str(row.get('Brand', '')).strip() if pd.notna(row.get('Brand')) else ''
-                
-                # Validate data
-                if not name or name == 'nan':
-                    results['errors'].append(f'Row {index + 2}: Product name is required')
-                    continue
-                
-                if price <= 0:
-                    results['errors'].append(f'Row {index + 2}: Price must be greater than 0')
-                    continue
-                
-                if stock < 0:
-                    results['errors'].append(f'Row {index + 2}: Stock cannot be negative')
-                    continue
-                
-                # Find or create category
-                category = Category.query.filter_by(name=category_name).first()
-                if not category:
-                    # Create new category
-                    category = Category(
-                        name=category_name,
-                        description=f'Auto-created category for {category_name}',
-                        is_active=True
-                    )
-                    db.session.add(category)
-                    db.session.flush()  # Get the ID
-                
-                # Check if product already exists
-                existing_product = Product.query.filter_by(name=name).first()
-                if existing_product:
-                    results['errors'].append(f'Row {index + 2}: Product "{name}" already exists')
-                    continue
-                
-                # Create new product
-                product = Product(
-                    name=name,
-                    description=description,
-                    price=price,
-                    stock_quantity=stock,
-                    category_id=category.id,
-                    brand=brand,
-                    is_active=True,
-                    is_featured=False
-                )
-                
-                db.session.add(product)
-                results['successful_imports'] += 1
-                results['imported_products'].append({
-                    'name': name,
-                    'price': price,
-                    'category': category_name,
-                    'stock': stock
-                })
-                
-            except ValueError as e:
-                results['errors'].append(f'Row {index + 2}: Invalid data format - {str(e)}')
-            except Exception as e:
-                results['errors'].append(f'Row {index + 2}: Error processing row - {str(e)}')
+        for df in chunks:
+            # Validate required columns
+            columns = set(df.columns)
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+            
+            if missing_columns:
+                return {
+                    'success': False, 
+                    'error': f'Missing required columns: {", ".join(missing_columns)}. Required: Name, Price, Category, Stock'
+                }
+            
+            # Process each row
+            results['total_rows'] += len(df)
+            import_product_rows(df, results, seen_names, category_ids)
         
-        # Commit all changes
-        if results['successful_imports'] > 0:
-            db.session.commit()
-        else:
+        # Drop categories created for rows that were never imported
+        if results['successful_imports'] == 0:
             db.session.rollback()
         
         return results
@@ -146,11 +218,13 @@ def process_bulk_upload(file, upload_folder):
     
     finally:
         # Clean up temporary file
-        if os.path.exists(filepath):
+        try:
             os.remove(filepath)
+        except FileNotFoundError:
+            pass
 
-def generate_sample_csv():
-    """Generate a sample CSV template for bulk upload"""
+def build_sample_data():
+    """Build the sample rows for the bulk upload template"""
     sample_data = {
         'Name': [
             'Sample Cigarette Pack',
@@ -168,48 +242,48 @@ def generate_sample_csv():
         'Brand': ['Marlboro', 'Cohiba', 'RAW']
     }
     
-    df = pd.DataFrame(sample_data)
-    return df
+    return pd.DataFrame(sample_data)
+
+# Built once at import; callers get a copy they are free to modify
+SAMPLE_DATA = build_sample_data()
+
+def generate_sample_csv():
+    """Generate a sample CSV template for bulk upload"""
+    return SAMPLE_DATA.copy()
 
 def validate_bulk_upload_data(df):
     """Validate the structure and data of bulk upload DataFrame"""
     errors = []
     
     # Check required columns
-    required_columns = ['Name', 'Price', 'Category', 'Stock']
-    missing_columns = [col for col in required_columns if col not in df.columns]
+    columns = set(df.columns)
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
     
     if missing_columns:
         errors.append(f'Missing required columns: {", ".join(missing_columns)}')
         return errors
     
-    # Validate data types and values
-    for index, row in df.iterrows():
-        row_num = index + 2  # Account for header row
-        
-        # Check name
-        if pd.isna(row['Name']) or str(row['Name']).strip() == '':
-            errors.append(f'Row {row_num}: Product name is required')
-        
-        # Check price
-        try:
-            price = float(row['Price'])
-            if price <= 0:
-                errors.append(f'Row {row_num}: Price must be greater than 0')
-        except (ValueError, TypeError):
-            errors.append(f'Row {row_num}: Price must be a valid number')
-        
-        # Check stock
-        try:
-            stock = int(row['Stock'])
-            if stock < 0:
-                errors.append(f'Row {row_num}: Stock cannot be negative')
-        except (ValueError, TypeError):
-            errors.append(f'Row {row_num}: Stock must be a valid integer')
-        
-        # Check category
-        if pd.isna(row['Category']) or str(row['Category']).strip() == '':
-            errors.append(f'Row {row_num}: Category is required')
+    # Validate data types and values, one column at a time
+    names = df['Name'].astype(str).str.strip()
+    categories = df['Category'].astype(str).str.strip()
+    prices = pd.to_numeric(df['Price'], errors='coerce')
+    stocks = pd.to_numeric(df['Stock'], errors='coerce')
+    checks = [
+        (df['Name'].isna() | (names == ''), 'Product name is required'),
+        (prices.isna(), 'Price must be a valid number'),
+        (prices <= 0, 'Price must be greater than 0'),
+        (stocks.isna(), 'Stock must be a valid integer'),
+        (stocks < 0, 'Stock cannot be negative'),
+        (df['Category'].isna() | (categories == ''), 'Category is required'),
+    ]
+    
+    # Report failures row by row, in column order within a row
+    failed = pd.concat([mask for mask, message in checks], axis=1).to_numpy()
+    for position in failed.any(axis=1).nonzero()[0]:
+        row_num = df.index[position] + 2  # Account for header row
+        for failed_check, (_, message) in zip(failed[position], checks):
+            if failed_check:
+                errors.append(f'Row {row_num}: {message}')
     
     return errors
 
@@ -1,8 +1,17 @@
 import csv
 import io
+from itertools import islice
 from flask import flash
+from sqlalchemy import insert
 from src.models.unified_models import db, Product, Category
 
+BATCH_SIZE = 1000  # Rows read, looked up and committed per transaction
+
+def insert_products(products_data):
+    """Insert queued products with one executemany and commit them"""
+    db.session.execute(insert(Product), products_data)
+    db.session.commit()
+
 def process_bulk_upload(file):
     """
     Process bulk upload CSV file (simplified version without pandas)
@@ -13,101 +22,125 @@ def process_bulk_upload(file):
     Returns:
         dict: Result with success status and message
     """
+    committed_count = 0
     try:
-        # Read CSV content
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_input = csv.DictReader(stream)
+        # Decode the upload as it is read rather than loading it whole
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8', newline='')
+        reader = csv.reader(stream)
+        headers = next(reader, [])
+        
+        # Rows are padded by one blank cell, which columns missing from the
+        # header read from
+        width = len(headers) + 1
+        column_index = {header: i for i, header in enumerate(headers)}
+        name_i, description_i, price_i, stock_i, category_i, brand_i = (
+            column_index.get(column, len(headers))
+            for column in ('name', 'description', 'price', 'stock_quantity', 'category', 'brand')
+        )
+        rows = (row + [''] * (width - len(row)) for row in reader if row)
         
         success_count = 0
         error_count = 0
         errors = []
+        seen_names = set()
+        category_ids = {}
+        row_num = 1  # Row 1 is the header
         
-        for row_num, row in enumerate(csv_input, start=2):  # Start at 2 because row 1 is header
-            try:
-                # Extract data from row
-                name = row.get('name', '').strip()
-                description = row.get('description', '').strip()
-                price_str = row.get('price', '').strip()
-                stock_str = row.get('stock_quantity', '').strip()
-                category_name = row.get('category', '').strip()
-                brand = row.get('brand', '').strip()
-                
-                # Validation
-                if not name:
-                    errors.append(f"Row {row_num}: Product name is required")
-                    error_count += 1
-                    continue
-                
-                if not price_str:
-                    errors.append(f"Row {row_num}: Price is required")
-                    error_count += 1
-                    continue
-                
+        # Import BATCH_SIZE rows at a time, each batch in its own transaction
+        for batch in iter(lambda: list(islice(rows, BATCH_SIZE)), []):
+            products_data = []
+            
+            # Look up every category and existing product named in the batch at once
+            names = {row[name_i].strip() for row in batch}
+            category_names = {row[category_i].strip() for row in batch} - category_ids.keys()
+            existing_names = set(db.session.scalars(db.select(Product.name).where(Product.name.in_(names))))
+            category_ids.update(db.session.execute(
+                db.select(Category.name, Category.id).where(Category.name.in_(category_names))).all())
+            
+            for row_num, row in enumerate(batch, start=row_num + 1):
                 try:
-                    price = float(price_str)
-                    if price <= 0:
-                        errors.append(f"Row {row_num}: Price must be greater than 0")
+                    # Extract data from row
+                    name = row[name_i].strip()
+                    description = row[description_i].strip()
+                    price_str = row[price_i].strip()
+                    stock_str = row[stock_i].strip()
+                    category_name = row[category_i].strip()
+                    brand = row[brand_i].strip()
+                    
+                    # Validation
+                    if not name:
+                        errors.append(f"Row {row_num}: Product name is required")
                         error_count += 1
                         continue
-                except ValueError:
-                    errors.append(f"Row {row_num}: Invalid price format")
-                    error_count += 1
-                    continue
-                
-                try:
-                    stock_quantity = int(stock_str) if stock_str else 0
-                    if stock_quantity < 0:
-                        errors.append(f"Row {row_num}: Stock quantity cannot be negative")
+                    
+                    if not price_str:
+                        errors.append(f"Row {row_num}: Price is required")
                         error_count += 1
                         continue
-                except ValueError:
-                    errors.append(f"Row {row_num}: Invalid stock quantity format")
-                    error_count += 1
-                    continue
-                
-                # Find or create category
-                category_id = None
-                if category_name:
-                    category = Category.query.filter_by(name=category_name).first()
-                    if not category:
-                        # Create new category
-                        category = Category(
-                            name=category_name,
-                            description=f"Auto-created category for {category_name}"
-                        )
-                        db.session.add(category)
-                        db.session.flush()  # Get the ID
-                    category_id = category.id
-                
-                # Check if product already exists
-                existing_product = Product.query.filter_by(name=name).first()
-                if existing_product:
-                    errors.append(f"Row {row_num}: Product '{name}' already exists")
+                    
+                    try:
+                        price = float(price_str)
+                        if price <= 0:
+                            errors.append(f"Row {row_num}: Price must be greater than 0")
+                            error_count += 1
+                            continue
+                    except ValueError:
+                        errors.append(f"Row {row_num}: Invalid price format")
+                        error_count += 1
+                        continue
+                    
+                    try:
+                        stock_quantity = int(stock_str) if stock_str else 0
+                        if stock_quantity < 0:
+                            errors.append(f"Row {row_num}: Stock quantity cannot be negative")
+                            error_count += 1
+                            continue
+                    except ValueError:
+                        errors.append(f"Row {row_num}: Invalid stock quantity format")
+                        error_count += 1
+                        continue
+                    
+                    # Find or create category
+                    category_id = None
+                    if category_name:
+                        category_id = category_ids.get(category_name)
+                        if category_id is None:
+                            # Create new category
+                            category = Category(
+                                name=category_name,
+                                description=f"Auto-created category for {category_name}"
+                            )
+                            db.session.add(category)
+                            db.session.flush()  # Get the ID
+                            category_id = category_ids[category_name] = category.id
+                    
+                    # Check if product already exists, in the database or earlier in this file
+                    if name in seen_names or name in existing_names:
+                        errors.append(f"Row {row_num}: Product '{name}' already exists")
+                        error_count += 1
+                        continue
+                    
+                    # Queue new product for the bulk insert
+                    seen_names.add(name)
+                    products_data.append({
+                        'name': name,
+                        'description': description,
+                        'price': price,
+                        'stock_quantity': stock_quantity,
+                        'category_id': category_id,
+                        'brand': brand,
+                        'is_active': True,
+                        'is_featured': False
+                    })
+                    success_count += 1
+                    
+                except Exception as e:
+                    errors.append(f"Row {row_num}: {str(e)}")
                     error_count += 1
-                    continue
-                
-                # Create new product
-                product = Product(
-                    name=name,
-                    description=description,
-                    price=price,
-                    stock_quantity=stock_quantity,
-                    category_id=category_id,
-                    brand=brand,
-                    is_active=True,
-                    is_featured=False
-                )
-                
-                db.session.add(product)
-                success_count += 1
-                
-            except Exception as e:
-                errors.append(f"Row {row_num}: {str(e)}")
-                error_count += 1
-        
-        # Commit all changes
-        if success_count > 0:
-            db.session.commit()
+            
+            if products_data:
+                insert_products(products_data)
+                committed_count += len(products_data)
         
         # Prepare result
         result = {
@@ -121,10 +154,11 @@ def process_bulk_upload(file):
         return result
         
     except Exception as e:
+        # Batches committed before the failure stay imported
         db.session.rollback()
         return {
-            'success': False,
-            'success_count': 0,
+            'success': committed_count > 0,
+            'success_count': committed_count,
             'error_count': 1,
             'errors': [f"File processing error: {str(e)}"],
             'total_errors': 1
@@ -141,14 +175,16 @@ def validate_csv_headers(file):
         dict: Validation result
     """
     try:
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_reader = csv.reader(stream)
-        headers = next(csv_reader, [])
+        # Only the header line is needed; rewind so the rows can still be processed
+        first_line = file.stream.readline().decode("UTF8", errors="replace")
+        file.stream.seek(0)
+        headers = next(csv.reader([first_line]), [])
         
         required_headers = ['name', 'price']
         optional_headers = ['description', 'stock_quantity', 'category', 'brand']
         
-        missing_required = [h for h in required_headers if h not in headers]
+        header_set = set(headers)
+        missing_required = [h for h in required_headers if h not in header_set]
         
         if missing_required:
             return {
@@ -168,13 +204,8 @@ def validate_csv_headers(file):
             'message': f"Error reading CSV file: {str(e)}"
         }
 
-def generate_csv_template():
-    """
-    Generate CSV template for bulk upload
-    
-    Returns:
-        str: CSV template content
-    """
+def build_csv_template():
+    """Build the CSV template for bulk upload"""
     template_data = [
         ['name', 'description', 'price', 'stock_quantity', 'category', 'brand'],
         ['Example Product 1', 'Product description here', '19.99', '100', 'Cigarettes', 'Marlboro'],
@@ -188,3 +219,14 @@ def generate_csv_template():
     
     return output.getvalue()
 
+# The template never changes, so it is built once at import
+CSV_TEMPLATE = build_csv_template()
+
+def generate_csv_template():
+    """
+    Generate CSV template for bulk upload
+    
+    Returns:
+        str: CSV template content
+    """
+    return CSV_TEMPLATE
@@ -0,0 +1,32 @@
+import time
+from functools import wraps
+
+def ttl_cache(seconds):
+    """
+    Cache a function's return value in-process for a number of seconds
+    
+    The wrapped function gets a cache_clear() method so writers can
+    invalidate the cached value immediately. Expired values are evicted
+    whenever a new one is computed.
+    """
+    def decorator(f):
+        entries = {}
+        
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+            now = time.monotonic()
+            entry = entries.get(key)
+            if entry is None or entry[0] <= now:
+                # Drop every expired entry, so keys that are never asked for
+                # again (like a past day's report) do not pile up
+                for old_key, (expires, _) in list(entries.items()):
+                    if expires <= now:
+                        entries.pop(old_key, None)
+                entry = (now + seconds, f(*args, **kwargs))
+                entries[key] = entry
+            return entry[1]
+        
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
@@ -0,0 +1,18 @@
+from flask import session
+from src.models.unified_models import db, CartItem
+
+def get_cart_count():
+    """Get cart item count for the logged in user, cached in the session"""
+    if 'user_id' not in session:
+        return 0
+    
+    cart_count = session.get('cart_count')
+    if cart_count is None:
+        cart_count = db.session.query(db.func.count(CartItem.id)).filter_by(
+            user_id=session['user_id']).scalar()
+        session['cart_count'] = cart_count
+    return cart_count
+
+def reset_cart_count():
+    """Drop the cached cart count so it is recounted on next use"""
+    session.pop('cart_count', None)
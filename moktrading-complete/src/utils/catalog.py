@@ -0,0 +1,92 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.unified_models import db, Category, Product
+from src.utils.cache import ttl_cache
+
+CATALOG_CACHE_SECONDS = 300
+FEATURED_CACHE_SECONDS = 120
+
+_catalog_caches = []
+
+def catalog_cache(seconds=CATALOG_CACHE_SECONDS):
+    """Cache catalog data for a number of seconds, cleared by clear_catalog_cache()"""
+    def decorator(f):
+        cached = ttl_cache(seconds)(f)
+        _catalog_caches.append(cached)
+        return cached
+    return decorator
+
+@catalog_cache()
+def get_category_choices(active_only=True):
+    """Get categories for the navigation menu and dropdowns as plain id/name dicts"""
+    # Select only the columns menus render so no Category objects (or their
+    # lazy relationships) are ever loaded for them
+    query = db.session.query(Category.id, Category.name)
+    if active_only:
+        query = query.filter_by(is_active=True)
+    return [{'id': row.id, 'name': row.name} for row in query.all()]
+
+@catalog_cache(FEATURED_CACHE_SECONDS)
+def get_featured_products(limit=8):
+    """Get featured products for the home page as plain dicts, falling back to the newest"""
+    products = Product.query.filter_by(is_featured=True, is_active=True).limit(limit).all()
+    if not products:
+        products = Product.query.filter_by(is_active=True).order_by(Product.created_at.desc()).limit(limit).all()
+    
+    return [{
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': float(product.price),
+        'brand': product.brand,
+        'image_filename': product.image_filename,
+        'image_url': product.image_url,
+        'is_featured': product.is_featured,
+        'is_in_stock': product.is_in_stock
+    } for product in products]
+
+def clear_catalog_cache():
+    """Invalidate cached catalog data after admin changes"""
+    for cached in _catalog_caches:
+        cached.cache_clear()
+
+def _changes_cached_catalog(product):
+    """Whether an updated product changes anything the catalog caches show"""
+    state = inspect(product)
+    for column in state.mapper.column_attrs:
+        history = state.attrs[column.key].history
+        if not history.has_changes():
+            continue
+        if column.key != 'stock_quantity':
+            return True
+        # Checkout lowers stock on every order; the cached data only shows
+        # whether a product is in stock, so only count it when that flips
+        if not history.deleted or not history.added:
+            return True
+        if ((history.deleted[0] or 0) > 0) != ((history.added[0] or 0) > 0):
+            return True
+    return False
+
+@event.listens_for(Session, 'after_flush')
+def track_catalog_changes(session, flush_context):
+    """Note flushes that change cached catalog data, e.g. a product selling out"""
+    changed = (
+        *session.new,
+        *session.deleted,
+        *(obj for obj in session.dirty if not isinstance(obj, Product) or _changes_cached_catalog(obj))
+    )
+    for obj in changed:
+        if isinstance(obj, (Category, Product)):
+            session.info['catalog_changed'] = True
+            return
+
+@event.listens_for(Session, 'after_commit')
+def clear_changed_catalog(session):
+    """Drop cached catalog data once catalog changes are committed"""
+    if session.info.pop('catalog_changed', False):
+        clear_catalog_cache()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_catalog_changes(session, previous_transaction):
+    """Rolled back changes never reached the catalog"""
+    session.info.pop('catalog_changed', None)
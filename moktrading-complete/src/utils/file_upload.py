@@ -1,15 +1,25 @@
 import os
-import uuid
+from flask import has_request_context, request
 from werkzeug.utils import secure_filename
 import secrets
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+SAVE_BUFFER_SIZE = 1024 * 1024  # Copy uploads to disk 1MB at a time, not Werkzeug's 16KB
+UPLOAD_URL_PREFIX = '/static/uploads/'  # Where the static route serves UPLOAD_FOLDER
+
+_ready_upload_folders = set()
+
+def ensure_upload_folder(upload_folder):
+    """Create the upload directory on first use in this process"""
+    if upload_folder not in _ready_upload_folders:
+        os.makedirs(upload_folder, exist_ok=True)
+        _ready_upload_folders.add(upload_folder)
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    dot = filename.rfind('.')
+    return dot != -1 and filename[dot + 1:].lower() in ALLOWED_EXTENSIONS
 
 def generate_unique_filename(filename):
     """Generate a unique filename while preserving the extension"""
@@ -17,13 +27,11 @@ def generate_unique_filename(filename):
         return None
     
     # Get file extension
-    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-    
-    # Generate unique filename
-    unique_id = str(uuid.uuid4())[:8]
-    timestamp = secrets.token_hex(4)
+    dot = filename.rfind('.')
+    ext = filename[dot + 1:].lower() if dot != -1 else ''
     
-    return f"{unique_id}_{timestamp}.{ext}"
+    # One 128-bit random name; URL-safe base64 is also safe as a filename
+    return f"{secrets.token_urlsafe(16)}.{ext}"
 
 def save_uploaded_file(file, upload_folder):
     """
@@ -42,13 +50,16 @@ def save_uploaded_file(file, upload_folder):
     if not allowed_file(file.filename):
         raise ValueError("File type not allowed. Please use PNG, JPG, JPEG, GIF, or WebP.")
     
-    # Check file size
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)
-    
-    if file_size > MAX_FILE_SIZE:
-        raise ValueError("File size too large. Maximum size is 5MB.")
+    # Check file size. The request body bounds the file's size, so only seek
+    # through the file when the body alone could be over the limit
+    content_length = request.content_length if has_request_context() else None
+    if content_length is None or content_length > MAX_FILE_SIZE:
+        file.seek(0, os.SEEK_END)
+        file_size = file.tell()
+        file.seek(0)
+        
+        if file_size > MAX_FILE_SIZE:
+            raise ValueError("File size too large. Maximum size is 5MB.")
     
     # Generate unique filename
     filename = generate_unique_filename(file.filename)
@@ -56,19 +67,21 @@ def save_uploaded_file(file, upload_folder):
         raise ValueError("Invalid filename.")
     
     # Ensure upload directory exists
-    os.makedirs(upload_folder, exist_ok=True)
+    ensure_upload_folder(upload_folder)
     
     # Save file
     filepath = os.path.join(upload_folder, filename)
     
     try:
-        file.save(filepath)
+        file.save(filepath, buffer_size=SAVE_BUFFER_SIZE)
         return filename
         
     except Exception as e:
         # Clean up file if it was created
-        if os.path.exists(filepath):
+        try:
             os.remove(filepath)
+        except FileNotFoundError:
+            pass
         raise ValueError(f"Error saving file: {str(e)}")
 
 def save_uploaded_image(file, upload_folder, max_size=(800, 800)):
@@ -92,13 +105,14 @@ def delete_image_file(filename, upload_folder):
     
     filepath = os.path.join(upload_folder, filename)
     try:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        return True
-    except Exception:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass  # Already gone
+    except OSError:
         return False
+    return True
 
-def get_image_url(filename, static_url_prefix='/static/uploads/'):
+def get_image_url(filename, static_url_prefix=UPLOAD_URL_PREFIX):
     """Get the URL for an uploaded image"""
     if not filename:
         return None
@@ -0,0 +1,39 @@
+def query_budget(limit):
+    """
+    Set the most SQL statements a view should issue per request
+
+    In development each request's statements are counted, and views that
+    go over their budget are logged as a likely N+1 regression.
+    """
+    def decorator(f):
+        f.query_budget = limit
+        return f
+    return decorator
+
+class SeekPage:
+    """One page of orders-style listings, paged by id instead of OFFSET"""
+    
+    def __init__(self, items, has_prev, has_next):
+        self.items = items
+        self.has_prev = has_prev
+        self.has_next = has_next
+        # Cursors for the neighbouring pages: the first and last ids shown
+        self.prev_cursor = items[0].id if items else None
+        self.next_cursor = items[-1].id if items else None
+
+def seek_page(query, model, after=None, before=None, per_page=20):
+    """
+    Newest-first page of query continuing past an id cursor
+    
+    after gives the rows older than that id and before the rows newer than
+    it, so each page is a short index range scan however deep it is.
+    """
+    if before is not None:
+        rows = query.filter(model.id > before).order_by(model.id.asc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        return SeekPage(rows[:per_page][::-1], has_prev, True)
+    
+    if after is not None:
+        query = query.filter(model.id < after)
+    rows = query.order_by(model.id.desc()).limit(per_page + 1).all()
+    return SeekPage(rows[:per_page], after is not None, len(rows) > per_page)
@@ -1,14 +1,97 @@
+import random
 import schedule
-import time
 import threading
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import and_, case, func
 from src.models.unified_models import db, Order, OrderItem, Product, User, CartItem
+from src.utils.cache import ttl_cache
 from src.utils.notifications import notification_service
 import logging
 
 logger = logging.getLogger(__name__)
 
+SCHEDULER_ERROR_BASE_DELAY = 1  # Seconds
+SCHEDULER_ERROR_MAX_DELAY = 300  # Seconds
+
+REPORT_CACHE_SECONDS = 300
+
+@ttl_cache(REPORT_CACHE_SECONDS)
+def daily_report_data(today):
+    """Daily report figures for a date, cached so repeat runs skip the queries"""
+    start_of_day = datetime.combine(today, datetime.min.time())
+    end_of_day = datetime.combine(today, datetime.max.time())
+    
+    # Orders data, aggregated in a single query
+    totals = Order.query.filter(
+        Order.created_at >= start_of_day,
+        Order.created_at <= end_of_day
+    ).with_entities(
+        func.count(Order.id).label('total_orders'),
+        func.coalesce(func.sum(Order.total_amount), 0).label('total_revenue'),
+        # Payment breakdown
+        func.coalesce(func.sum(case(
+            (and_(Order.payment_method == 'cash', Order.payment_status == 'paid'), Order.total_amount),
+            else_=0)), 0).label('cash_payments'),
+        func.coalesce(func.sum(case(
+            (and_(Order.payment_method == 'credit', Order.payment_status == 'paid'), Order.total_amount),
+            else_=0)), 0).label('credit_payments'),
+        func.coalesce(func.sum(case((Order.payment_status == 'pending', Order.total_amount), else_=0)), 0).label('pending_payments'),
+        # Order status breakdown
+        func.count(case((Order.status == 'completed', 1))).label('completed_orders'),
+        func.count(case((Order.status == 'processing', 1))).label('processing_orders'),
+        func.count(case((Order.status == 'pending', 1))).label('pending_orders')
+    ).one()
+    
+    total_orders = totals.total_orders
+    total_revenue = float(totals.total_revenue)
+    cash_payments = float(totals.cash_payments)
+    credit_payments = float(totals.credit_payments)
+    pending_payments = float(totals.pending_payments)
+    completed_orders = totals.completed_orders
+    processing_orders = totals.processing_orders
+    pending_orders = totals.pending_orders
+    
+    # Customer data
+    new_customers = User.query.filter(
+        User.role == 'customer',
+        User.created_at >= start_of_day,
+        User.created_at <= end_of_day
+    ).count()
+    
+    active_carts = db.session.query(CartItem.user_id).distinct().count()
+    
+    # Top products
+    top_products = db.session.query(
+        Product.name,
+        func.sum(OrderItem.quantity).label('total_sold'),
+        func.sum(OrderItem.quantity * OrderItem.price).label('revenue')
+    ).join(OrderItem).join(Order).filter(
+        Order.created_at >= start_of_day,
+        Order.created_at <= end_of_day
+    ).group_by(Product.id).order_by(
+        func.sum(OrderItem.quantity * OrderItem.price).desc()
+    ).limit(5).all()
+    
+    top_products_text = "\n".join(
+        f"{i}. {name} - {sold} sold (${revenue:.2f})"
+        for i, (name, sold, revenue) in enumerate(top_products, 1)
+    )
+    
+    return {
+        'date': today.strftime('%Y-%m-%d'),
+        'total_orders': total_orders,
+        'total_revenue': total_revenue,
+        'cash_payments': cash_payments,
+        'credit_payments': credit_payments,
+        'pending_payments': pending_payments,
+        'completed_orders': completed_orders,
+        'processing_orders': processing_orders,
+        'pending_orders': pending_orders,
+        'new_customers': new_customers,
+        'active_carts': active_carts,
+        'top_products_text': top_products_text or 'No sales today'
+    }
+
 class ReportingService:
     """Automated reporting service for daily and weekly business reports"""
     
@@ -16,6 +99,7 @@ class ReportingService:
         self.app = app
         self.scheduler_thread = None
         self.running = False
+        self._wake = threading.Event()  # Set by stop_scheduler to end the current sleep
         
         if app:
             self.init_app(app)
@@ -36,6 +120,7 @@ class ReportingService:
         """Start the background scheduler"""
         if not self.running:
             self.running = True
+            self._wake.clear()
             self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
             self.scheduler_thread.start()
             logger.info("Automated reporting scheduler started")
@@ -43,19 +128,26 @@ class ReportingService:
     def stop_scheduler(self):
         """Stop the background scheduler"""
         self.running = False
+        self._wake.set()
         if self.scheduler_thread:
             self.scheduler_thread.join()
         logger.info("Automated reporting scheduler stopped")
     
     def _run_scheduler(self):
         """Run the scheduler in background thread"""
+        error_delay = SCHEDULER_ERROR_BASE_DELAY
         while self.running:
             try:
                 schedule.run_pending()
-                time.sleep(60)  # Check every minute
+                error_delay = SCHEDULER_ERROR_BASE_DELAY
+                # Sleep until the next job is due rather than polling
+                idle = schedule.idle_seconds()
+                self._wake.wait(None if idle is None else max(idle, 0))
             except Exception as e:
-                logger.error(f"Scheduler error: {str(e)}")
-                time.sleep(300)  # Wait 5 minutes on error
+                logger.error("Scheduler error: %s", e)
+                # Decorrelated jitter: retry soon after a one-off error, back off if it persists
+                error_delay = min(SCHEDULER_ERROR_MAX_DELAY, random.uniform(SCHEDULER_ERROR_BASE_DELAY, error_delay * 3))
+                self._wake.wait(error_delay)
     
     def _run_daily_report(self):
         """Generate and send daily report"""
@@ -71,7 +163,7 @@ class ReportingService:
                     logger.error("Failed to send daily report")
                     
         except Exception as e:
-            logger.error(f"Error generating daily report: {str(e)}")
+            logger.error("Error generating daily report: %s", e)
     
     def _run_weekly_report(self):
         """Generate and send weekly report"""
@@ -87,7 +179,7 @@ class ReportingService:
                     logger.error("Failed to send weekly report")
                     
         except Exception as e:
-            logger.error(f"Error generating weekly report: {str(e)}")
+            logger.error("Error generating weekly report: %s", e)
     
     def _cleanup_old_data(self):
         """Clean up old temporary data"""
@@ -95,88 +187,24 @@ class ReportingService:
             with self.app.app_context():
                 # Clean up old cart items (older than 30 days)
                 cutoff_date = datetime.now() - timedelta(days=30)
-                old_carts = CartItem.query.filter(CartItem.created_at < cutoff_date).all()
-                
-                for cart_item in old_carts:
-                    db.session.delete(cart_item)
+                deleted = CartItem.query.filter(
+                    CartItem.created_at < cutoff_date
+                ).delete(synchronize_session=False)  # Single DELETE, no rows loaded
                 
                 db.session.commit()
-                logger.info(f"Cleaned up {len(old_carts)} old cart items")
+                logger.info("Cleaned up %d old cart items", deleted)
                 
         except Exception as e:
-            logger.error(f"Error during cleanup: {str(e)}")
+            logger.error("Error during cleanup: %s", e)
     
     def generate_daily_report(self):
         """Generate daily business report data"""
         try:
             today = datetime.now().date()
-            start_of_day = datetime.combine(today, datetime.min.time())
-            end_of_day = datetime.combine(today, datetime.max.time())
-            
-            # Orders data
-            daily_orders = Order.query.filter(
-                Order.created_at >= start_of_day,
-                Order.created_at <= end_of_day
-            ).all()
-            
-            total_orders = len(daily_orders)
-            total_revenue = sum(float(order.total_amount) for order in daily_orders)
-            
-            # Payment breakdown
-            cash_payments = sum(float(order.total_amount) for order in daily_orders 
-                              if order.payment_method == 'cash' and order.payment_status == 'paid')
-            credit_payments = sum(float(order.total_amount) for order in daily_orders 
-                                if order.payment_method == 'credit' and order.payment_status == 'paid')
-            pending_payments = sum(float(order.total_amount) for order in daily_orders 
-                                 if order.payment_status == 'pending')
-            
-            # Order status breakdown
-            completed_orders = len([o for o in daily_orders if o.status == 'completed'])
-            processing_orders = len([o for o in daily_orders if o.status == 'processing'])
-            pending_orders = len([o for o in daily_orders if o.status == 'pending'])
-            
-            # Customer data
-            new_customers = User.query.filter(
-                User.role == 'customer',
-                User.created_at >= start_of_day,
-                User.created_at <= end_of_day
-            ).count()
-            
-            active_carts = db.session.query(CartItem.user_id).distinct().count()
-            
-            # Top products
-            top_products = db.session.query(
-                Product.name,
-                func.sum(OrderItem.quantity).label('total_sold'),
-                func.sum(OrderItem.quantity * OrderItem.price).label('revenue')
-            ).join(OrderItem).join(Order).filter(
-                Order.created_at >= start_of_day,
-                Order.created_at <= end_of_day
-            ).group_by(Product.id).order_by(
-                func.sum(OrderItem.quantity * OrderItem.price).desc()
-            ).limit(5).all()
-            
-            top_products_text = ""
-            for i, (name, sold, revenue) in enumerate(top_products, 1):
-                top_products_text += f"{i}. {name} - {sold} sold (${revenue:.2f})\\n"
-            
-            return {
-                'date': today.strftime('%Y-%m-%d'),
-                'total_orders': total_orders,
-                'total_revenue': total_revenue,
-                'cash_payments': cash_payments,
-                'credit_payments': credit_payments,
-                'pending_payments': pending_payments,
-                'completed_orders': completed_orders,
-                'processing_orders': processing_orders,
-                'pending_orders': pending_orders,
-                'new_customers': new_customers,
-                'active_carts': active_carts,
-                'top_products_text': top_products_text or 'No sales today'
-            }
+            return daily_report_data(today)
             
         except Exception as e:
-            logger.error(f"Error generating daily report data: {str(e)}")
+            logger.error("Error generating daily report data: %s", e)
             return {}
     
     def generate_weekly_report(self):
@@ -189,22 +217,30 @@ class ReportingService:
             start_of_week = datetime.combine(week_start, datetime.min.time())
             end_of_week = datetime.combine(week_end, datetime.max.time())
             
-            # Weekly orders
-            weekly_orders = Order.query.filter(
+            # Weekly orders, totalled per day in a single query
+            order_date = func.date(Order.created_at)
+            daily_rows = Order.query.filter(
                 Order.created_at >= start_of_week,
                 Order.created_at <= end_of_week
-            ).all()
-            
-            total_orders = len(weekly_orders)
-            total_revenue = sum(float(order.total_amount) for order in weekly_orders)
+            ).with_entities(
+                order_date.label('date'),
+                func.count(Order.id).label('orders'),
+                func.sum(Order.total_amount).label('revenue'),
+                # Payment breakdown
+                func.sum(case(
+                    (and_(Order.payment_method == 'cash', Order.payment_status == 'paid'), Order.total_amount),
+                    else_=0)).label('cash'),
+                func.sum(case(
+                    (and_(Order.payment_method == 'credit', Order.payment_status == 'paid'), Order.total_amount),
+                    else_=0)).label('credit'),
+                func.sum(case((Order.payment_status == 'pending', Order.total_amount), else_=0)).label('unpaid')
+            ).group_by(order_date).all()
             
-            # Payment breakdown
-            cash_total = sum(float(order.total_amount) for order in weekly_orders 
-                           if order.payment_method == 'cash' and order.payment_status == 'paid')
-            credit_total = sum(float(order.total_amount) for order in weekly_orders 
-                             if order.payment_method == 'credit' and order.payment_status == 'paid')
-            unpaid_total = sum(float(order.total_amount) for order in weekly_orders 
-                             if order.payment_status == 'pending')
+            total_orders = sum(row.orders for row in daily_rows)
+            total_revenue = sum(float(row.revenue) for row in daily_rows)
+            cash_total = sum(float(row.cash) for row in daily_rows)
+            credit_total = sum(float(row.credit) for row in daily_rows)
+            unpaid_total = sum(float(row.unpaid) for row in daily_rows)
             
             # Customer metrics
             weekly_customers = User.query.filter(
@@ -213,21 +249,19 @@ class ReportingService:
                 User.created_at <= end_of_week
             ).count()
             
-            # Daily breakdown
+            # Daily breakdown; days without orders have no row
+            by_day = {row.date: row for row in daily_rows}
             daily_breakdown = []
             for i in range(7):
                 day = week_start + timedelta(days=i)
-                day_start = datetime.combine(day, datetime.min.time())
-                day_end = datetime.combine(day, datetime.max.time())
-                
-                day_orders = [o for o in weekly_orders if day_start <= o.created_at <= day_end]
-                day_revenue = sum(float(o.total_amount) for o in day_orders)
+                date = day.strftime('%Y-%m-%d')
+                row = by_day.get(date)
                 
                 daily_breakdown.append({
                     'day': day.strftime('%A'),
-                    'date': day.strftime('%Y-%m-%d'),
-                    'orders': len(day_orders),
-                    'revenue': day_revenue
+                    'date': date,
+                    'orders': row.orders if row else 0,
+                    'revenue': float(row.revenue) if row else 0
                 })
             
             return {
@@ -243,39 +277,44 @@ class ReportingService:
             }
             
         except Exception as e:
-            logger.error(f"Error generating weekly report data: {str(e)}")
+            logger.error("Error generating weekly report data: %s", e)
             return {}
     
     def generate_financial_summary(self):
         """Generate current financial summary"""
         try:
             # All time totals
-            all_orders = Order.query.all()
-            total_cash = sum(float(order.total_amount) for order in all_orders 
-                           if order.payment_method == 'cash' and order.payment_status == 'paid')
-            total_credit = sum(float(order.total_amount) for order in all_orders 
-                             if order.payment_method == 'credit' and order.payment_status == 'paid')
-            total_unpaid = sum(float(order.total_amount) for order in all_orders 
-                             if order.payment_status == 'pending')
+            totals = db.session.query(
+                func.count(Order.id).label('order_count'),
+                func.coalesce(func.sum(case(
+                    (and_(Order.payment_method == 'cash', Order.payment_status == 'paid'), Order.total_amount),
+                    else_=0)), 0).label('cash'),
+                func.coalesce(func.sum(case(
+                    (and_(Order.payment_method == 'credit', Order.payment_status == 'paid'), Order.total_amount),
+                    else_=0)), 0).label('credit'),
+                func.coalesce(func.sum(case((Order.payment_status == 'pending', Order.total_amount), else_=0)), 0).label('unpaid')
+            ).one()
             
             # Current month
             today = datetime.now()
             month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             
-            monthly_orders = Order.query.filter(Order.created_at >= month_start).all()
-            monthly_revenue = sum(float(order.total_amount) for order in monthly_orders)
+            monthly = Order.query.filter(Order.created_at >= month_start).with_entities(
+                func.count(Order.id).label('order_count'),
+                func.coalesce(func.sum(Order.total_amount), 0).label('revenue')
+            ).one()
             
             return {
-                'total_cash': total_cash,
-                'total_credit': total_credit,
-                'total_unpaid': total_unpaid,
-                'monthly_revenue': monthly_revenue,
-                'total_orders': len(all_orders),
-                'monthly_orders': len(monthly_orders)
+                'total_cash': float(totals.cash),
+                'total_credit': float(totals.credit),
+                'total_unpaid': float(totals.unpaid),
+                'monthly_revenue': float(monthly.revenue),
+                'total_orders': totals.order_count,
+                'monthly_orders': monthly.order_count
             }
             
         except Exception as e:
-            logger.error(f"Error generating financial summary: {str(e)}")
+            logger.error("Error generating financial summary: %s", e)
             return {}
 
 # Global reporting service instance
@@ -1,18 +1,44 @@
 #!/usr/bin/env python3
 
+import random
 import schedule
-import time
 import threading
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
+from sqlalchemy.orm import selectinload
 from src.models.unified_models import db, Order, User, Product, OrderItem
 from src.utils.notifications import notification_service
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SCHEDULER_ERROR_BASE_DELAY = 1  # Seconds
+SCHEDULER_ERROR_MAX_DELAY = 60  # Seconds
+
+CREDIT_METHODS = frozenset({'card', 'credit'})
+
+# Order columns order_totals and the report breakdowns read
+ORDER_TOTAL_COLUMNS = (Order.total_amount, Order.payment_method, Order.payment_status,
+                       Order.status, Order.created_at)
+
+def order_totals(orders):
+    """Revenue, payment and status figures for a list of orders, in one pass"""
+    totals = {'revenue': 0, 'cash': 0, 'credit': 0, 'pending': 0, 'unpaid': 0, 'statuses': Counter()}
+    for order in orders:
+        amount = order.total_amount
+        totals['revenue'] += amount
+        if order.payment_method == 'cash':
+            totals['cash'] += amount
+        elif order.payment_method in CREDIT_METHODS:
+            totals['credit'] += amount
+        if order.payment_status != 'paid':
+            totals['unpaid'] += amount
+            if order.payment_status == 'pending':
+                totals['pending'] += amount
+        totals['statuses'][order.status] += 1
+    return totals
+
 class ReportScheduler:
     """Automated report scheduler for daily, weekly, and monthly sales reports"""
     
@@ -20,6 +46,7 @@ class ReportScheduler:
         self.app = app
         self.running = False
         self.scheduler_thread = None
+        self._wake = threading.Event()  # Set by stop_scheduler to end the current sleep
     
     def init_app(self, app):
         """Initialize with Flask app"""
@@ -32,6 +59,7 @@ class ReportScheduler:
             return
         
         self.running = True
+        self._wake.clear()
         
         # Schedule daily report at 11:59 PM
         schedule.every().day.at("23:59").do(self._run_daily_report)
@@ -54,18 +82,25 @@ class ReportScheduler:
     def stop_scheduler(self):
         """Stop the scheduler"""
         self.running = False
+        self._wake.set()
         schedule.clear()
         logger.info("📅 Report scheduler stopped")
     
     def _run_scheduler(self):
         """Background scheduler loop"""
+        error_delay = SCHEDULER_ERROR_BASE_DELAY
         while self.running:
             try:
                 schedule.run_pending()
-                time.sleep(60)  # Check every minute
+                error_delay = SCHEDULER_ERROR_BASE_DELAY
+                # Sleep until the next job is due rather than polling
+                idle = schedule.idle_seconds()
+                self._wake.wait(None if idle is None else max(idle, 0))
             except Exception as e:
-                logger.error(f"Scheduler error: {str(e)}")
-                time.sleep(60)
+                logger.error("Scheduler error: %s", e)
+                # Decorrelated jitter: retry soon after a one-off error, back off if it persists
+                error_delay = min(SCHEDULER_ERROR_MAX_DELAY, random.uniform(SCHEDULER_ERROR_BASE_DELAY, error_delay * 3))
+                self._wake.wait(error_delay)
     
     def _run_daily_report(self):
         """Generate and send daily report"""
@@ -81,7 +116,7 @@ class ReportScheduler:
                     logger.error("❌ Failed to send daily report")
                     
         except Exception as e:
-            logger.error(f"Error generating daily report: {str(e)}")
+            logger.error("Error generating daily report: %s", e)
     
     def _run_weekly_report(self):
         """Generate and send weekly report"""
@@ -97,7 +132,7 @@ class ReportScheduler:
                     logger.error("❌ Failed to send weekly report")
                     
         except Exception as e:
-            logger.error(f"Error generating weekly report: {str(e)}")
+            logger.error("Error generating weekly report: %s", e)
     
     def _check_monthly_report(self):
         """Check if today is the last day of month and send monthly report"""
@@ -118,7 +153,7 @@ class ReportScheduler:
                         logger.error("❌ Failed to send monthly report")
                         
         except Exception as e:
-            logger.error(f"Error generating monthly report: {str(e)}")
+            logger.error("Error generating monthly report: %s", e)
     
     def generate_daily_report(self):
         """Generate daily sales report data"""
@@ -127,22 +162,25 @@ class ReportScheduler:
             start_of_day = datetime.combine(today, datetime.min.time())
             end_of_day = datetime.combine(today, datetime.max.time())
             
-            # Get today's orders
-            daily_orders = Order.query.filter(
+            # Get today's orders, with the items and products the top products list reads
+            daily_orders = Order.query.options(
+                selectinload(Order.order_items).joinedload(OrderItem.product)
+            ).filter(
                 and_(Order.created_at >= start_of_day, Order.created_at <= end_of_day)
             ).all()
             
             # Calculate totals
+            totals = order_totals(daily_orders)
             total_orders = len(daily_orders)
-            total_revenue = sum(order.total_amount for order in daily_orders)
-            cash_payments = sum(order.total_amount for order in daily_orders if order.payment_method == 'cash')
-            credit_payments = sum(order.total_amount for order in daily_orders if order.payment_method in ['card', 'credit'])
-            pending_payments = sum(order.total_amount for order in daily_orders if order.payment_status == 'pending')
+            total_revenue = totals['revenue']
+            cash_payments = totals['cash']
+            credit_payments = totals['credit']
+            pending_payments = totals['pending']
             
             # Order status counts
-            completed_orders = len([o for o in daily_orders if o.status == 'completed'])
-            processing_orders = len([o for o in daily_orders if o.status == 'processing'])
-            pending_orders = len([o for o in daily_orders if o.status == 'pending'])
+            completed_orders = totals['statuses']['completed']
+            processing_orders = totals['statuses']['processing']
+            pending_orders = totals['statuses']['pending']
             
             # New customers today
             new_customers = User.query.filter(
@@ -172,7 +210,7 @@ class ReportScheduler:
             }
             
         except Exception as e:
-            logger.error(f"Error generating daily report data: {str(e)}")
+            logger.error("Error generating daily report data: %s", e)
             return {}
     
     def generate_weekly_report(self):
@@ -185,17 +223,18 @@ class ReportScheduler:
             start_datetime = datetime.combine(week_start, datetime.min.time())
             end_datetime = datetime.combine(week_end, datetime.max.time())
             
-            # Get week's orders
+            # Get week's orders, only the columns the totals and breakdown read
             weekly_orders = Order.query.filter(
                 and_(Order.created_at >= start_datetime, Order.created_at <= end_datetime)
-            ).all()
+            ).with_entities(*ORDER_TOTAL_COLUMNS).all()
             
             # Calculate totals
+            totals = order_totals(weekly_orders)
             total_orders = len(weekly_orders)
-            total_revenue = sum(order.total_amount for order in weekly_orders)
-            cash_total = sum(order.total_amount for order in weekly_orders if order.payment_method == 'cash')
-            credit_total = sum(order.total_amount for order in weekly_orders if order.payment_method in ['card', 'credit'])
-            unpaid_total = sum(order.total_amount for order in weekly_orders if order.payment_status != 'paid')
+            total_revenue = totals['revenue']
+            cash_total = totals['cash']
+            credit_total = totals['credit']
+            unpaid_total = totals['unpaid']
             
             # New customers this week
             weekly_customers = User.query.filter(
@@ -206,20 +245,21 @@ class ReportScheduler:
                 )
             ).count()
             
-            # Daily breakdown
+            # Daily breakdown, bucketing the orders by date in one pass
+            day_orders = Counter()
+            day_revenue = defaultdict(int)
+            for order in weekly_orders:
+                day = order.created_at.date()
+                day_orders[day] += 1
+                day_revenue[day] += order.total_amount
+            
             daily_breakdown = []
             for i in range(7):
                 day = week_start + timedelta(days=i)
-                day_start = datetime.combine(day, datetime.min.time())
-                day_end = datetime.combine(day, datetime.max.time())
-                
-                day_orders = [o for o in weekly_orders if day_start <= o.created_at <= day_end]
-                day_revenue = sum(o.total_amount for o in day_orders)
-                
                 daily_breakdown.append({
                     'day': day.strftime('%A'),
-                    'orders': len(day_orders),
-                    'revenue': day_revenue
+                    'orders': day_orders[day],
+                    'revenue': day_revenue[day]
                 })
             
             return {
@@ -235,7 +275,7 @@ class ReportScheduler:
             }
             
         except Exception as e:
-            logger.error(f"Error generating weekly report data: {str(e)}")
+            logger.error("Error generating weekly report data: %s", e)
             return {}
     
     def generate_monthly_report(self):
@@ -254,17 +294,18 @@ class ReportScheduler:
             start_datetime = datetime.combine(month_start, datetime.min.time())
             end_datetime = datetime.combine(month_end, datetime.max.time())
             
-            # Get month's orders
+            # Get month's orders, only the columns the totals and breakdown read
             monthly_orders = Order.query.filter(
                 and_(Order.created_at >= start_datetime, Order.created_at <= end_datetime)
-            ).all()
+            ).with_entities(*ORDER_TOTAL_COLUMNS).all()
             
             # Calculate totals
+            totals = order_totals(monthly_orders)
             total_orders = len(monthly_orders)
-            total_revenue = sum(order.total_amount for order in monthly_orders)
-            cash_total = sum(order.total_amount for order in monthly_orders if order.payment_method == 'cash')
-            credit_total = sum(order.total_amount for order in monthly_orders if order.payment_method in ['card', 'credit'])
-            unpaid_total = sum(order.total_amount for order in monthly_orders if order.payment_status != 'paid')
+            total_revenue = totals['revenue']
+            cash_total = totals['cash']
+            credit_total = totals['credit']
+            unpaid_total = totals['unpaid']
             
             # New customers this month
             monthly_customers = User.query.filter(
@@ -275,24 +316,27 @@ class ReportScheduler:
                 )
             ).count()
             
-            # Weekly breakdown
+            # Weekly breakdown; weeks run in sevens from the 1st, so an order's
+            # week follows from its day of the month
+            week_orders = Counter()
+            week_revenue = defaultdict(int)
+            for order in monthly_orders:
+                week = (order.created_at.date() - month_start).days // 7
+                week_orders[week] += 1
+                week_revenue[week] += order.total_amount
+            
             weekly_breakdown = []
             current_week_start = month_start
             week_num = 1
             
             while current_week_start <= month_end:
                 week_end_date = min(current_week_start + timedelta(days=6), month_end)
-                week_start_dt = datetime.combine(current_week_start, datetime.min.time())
-                week_end_dt = datetime.combine(week_end_date, datetime.max.time())
-                
-                week_orders = [o for o in monthly_orders if week_start_dt <= o.created_at <= week_end_dt]
-                week_revenue = sum(o.total_amount for o in week_orders)
                 
                 weekly_breakdown.append({
                     'week': f'Week {week_num}',
                     'dates': f'{current_week_start.strftime("%m/%d")} - {week_end_date.strftime("%m/%d")}',
-                    'orders': len(week_orders),
-                    'revenue': week_revenue
+                    'orders': week_orders[week_num - 1],
+                    'revenue': week_revenue[week_num - 1]
                 })
                 
                 current_week_start = week_end_date + timedelta(days=1)
@@ -312,7 +356,7 @@ class ReportScheduler:
             }
             
         except Exception as e:
-            logger.error(f"Error generating monthly report data: {str(e)}")
+            logger.error("Error generating monthly report data: %s", e)
             return {}
     
     def _get_top_products_daily(self, orders):
@@ -321,7 +365,7 @@ class ReportScheduler:
             product_sales = {}
             
             for order in orders:
-                for item in order.items:
+                for item in order.order_items:
                     product_name = item.product.name
                     if product_name in product_sales:
                         product_sales[product_name] += item.quantity
@@ -335,14 +379,12 @@ class ReportScheduler:
             sorted_products = sorted(product_sales.items(), key=lambda x: x[1], reverse=True)
             
             # Format top 3 products
-            top_products = []
-            for i, (product, qty) in enumerate(sorted_products[:3]):
-                top_products.append(f"{i+1}. {product} ({qty} sold)")
-            
-            return "\\n".join(top_products)
+            return "\n".join(
+                f"{i}. {product} ({qty} sold)" for i, (product, qty) in enumerate(sorted_products[:3], 1)
+            )
             
         except Exception as e:
-            logger.error(f"Error getting top products: {str(e)}")
+            logger.error("Error getting top products: %s", e)
             return "Error calculating top products"
     
     def send_test_reports(self):
@@ -370,7 +412,7 @@ class ReportScheduler:
                 }
                 
         except Exception as e:
-            logger.error(f"Error sending test reports: {str(e)}")
+            logger.error("Error sending test reports: %s", e)
             return {'error': str(e)}
 
 # Global scheduler instance
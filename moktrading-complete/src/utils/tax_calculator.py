@@ -5,14 +5,14 @@ Integrates with existing product and order models
 
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Dict, List, Optional
-from src.models.tax_models import StateTobaccoTax
+from src.models.tax_models import get_calculator
 from src.models.unified_models import Product, OrderItem
 
 class TaxCalculator:
     """Main tax calculation utility for the e-commerce system"""
     
     def __init__(self):
-        self.state_tax = StateTobaccoTax()
+        self.state_tax = get_calculator()
     
     def calculate_product_tax(self, product: Product, state: str, quantity: int = 1) -> Dict[str, Decimal]:
         """
@@ -37,7 +37,11 @@ class TaxCalculator:
             volume_ml=volume_ml
         )
         
-        # Add product-specific information
+        return self._add_product_details(tax_breakdown, product, product_type, base_price, quantity, state)
+    
+    def _add_product_details(self, tax_breakdown: Dict[str, Decimal], product: Product, product_type: str,
+                             base_price: Decimal, quantity: int, state: str) -> Dict[str, Decimal]:
+        """Add product-specific information to a tax breakdown"""
         tax_breakdown.update({
             'product_id': product.id,
             'product_name': product.name,
@@ -65,12 +69,18 @@ class TaxCalculator:
             'state': shipping_state
         }
         
-        for item in cart_items:
-            product = item['product']
-            quantity = item['quantity']
-            
-            # Calculate tax for this item
-            item_tax = self.calculate_product_tax(product, shipping_state, quantity)
+        # Calculate tax for every item in one batch
+        line_items = [
+            (self._get_product_type(item['product']), Decimal(str(item['product'].price)),
+             item['quantity'], self._extract_volume_ml(item['product']))
+            for item in cart_items
+        ]
+        tax_breakdowns = self.state_tax.calculate_total_tax_batch(shipping_state, line_items)
+        
+        for item, (product_type, base_price, quantity, volume_ml), tax_breakdown in zip(
+                cart_items, line_items, tax_breakdowns):
+            item_tax = self._add_product_details(
+                tax_breakdown, item['product'], product_type, base_price, quantity, shipping_state)
             
             # Add to cart summary
             cart_tax_summary['items'].append(item_tax)
@@ -83,6 +93,29 @@ class TaxCalculator:
         
         return cart_tax_summary
     
+    def calculate_cart_totals(self, cart_items: List[Dict], shipping_state: str) -> Dict[str, any]:
+        """
+        Calculate only the summed taxes and totals of a shopping cart, as calculate_cart_tax
+        does but without a per-item breakdown
+        cart_items: List of {'product': Product, 'quantity': int}
+        """
+        line_items = [
+            (self._get_product_type(item['product']), Decimal(str(item['product'].price)),
+             item['quantity'], self._extract_volume_ml(item['product']))
+            for item in cart_items
+        ]
+        invoice_tax = self.state_tax.calculate_invoice_tax(shipping_state, line_items)
+        subtotal = sum((base_price for _, base_price, _, _ in line_items), Decimal('0'))
+        
+        return {
+            'subtotal': subtotal,
+            'total_excise_tax': invoice_tax['excise_tax'],
+            'total_sales_tax': invoice_tax['sales_tax'],
+            'total_tax': invoice_tax['total_tax'],
+            'grand_total': subtotal + invoice_tax['total_tax'],
+            'state': shipping_state
+        }
+    
     def calculate_order_tax(self, order_items: List[OrderItem], shipping_state: str) -> Dict[str, Decimal]:
         """Calculate tax for an existing order"""
         cart_items = []
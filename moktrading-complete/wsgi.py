@@ -0,0 +1,6 @@
+# Production entry point for a WSGI server, e.g. `gunicorn wsgi:app` (see Procfile)
+import os
+import sys
+sys.path.insert(0, os.path.dirname(__file__))
+
+from src.main import app